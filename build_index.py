@@ -0,0 +1,62 @@
+import asyncio
+import os
+from logging import Logger
+
+from tqdm import tqdm
+
+from settings import BASE_PATH, LOGGING, COMPARING_FOLDER_NAME, PREFILTER, SHOT_SEARCH, LIBRARY_DEDUP
+from src.frame_compiler import FrameCompiler
+from src.logger import init_logger
+from src.seek_index import SeekIndex
+from src.video_catalog import VideoCatalog
+
+logger: Logger = init_logger(LOGGING['main'], "[bold red]\\[INDEX][/bold red]")
+
+
+async def main(comparing_folder_name: str = COMPARING_FOLDER_NAME):
+    """
+    Refresh video catalog and build cached per-video data (seek index, and summaries/shots/signatures if enabled),
+    so the search and tools don't have to build them on the fly
+    """
+    COMPARING_FOLDER = os.path.join(BASE_PATH, comparing_folder_name)
+
+    catalog = VideoCatalog()
+    videos = catalog.refresh(COMPARING_FOLDER)
+    logger.info(f"Catalog contains {len(videos)} videos")
+
+    if PREFILTER["use"]:
+        from src.video_summary import VideoSummary
+
+    pbar = tqdm(total=len(videos), desc="Indexing videos")
+    for video_path in videos:
+        await asyncio.to_thread(SeekIndex.load_or_build, video_path)
+
+        if PREFILTER["use"]:
+            await VideoSummary.load_or_build(video_path, PREFILTER["sample_interval"], catalog.get(video_path))
+
+        if SHOT_SEARCH["use"]:
+            async with FrameCompiler(video_path, catalog.get(video_path)) as frame_compiler:
+                await frame_compiler.get_shots(SHOT_SEARCH["cut_threshold"])
+
+        pbar.update()
+
+    pbar.close()
+
+    if LIBRARY_DEDUP["use"]:
+        from src.library_dedup import LibraryDeduplicator
+
+        await LibraryDeduplicator(
+            catalog,
+            LIBRARY_DEDUP["interval"],
+            LIBRARY_DEDUP["signature_seconds"],
+            LIBRARY_DEDUP["max_offset"],
+            LIBRARY_DEDUP["max_distance"],
+            LIBRARY_DEDUP["min_match_ratio"],
+            LIBRARY_DEDUP["duration_tolerance"]
+        ).find_duplicates(videos)
+
+    logger.info("[bold green]Done!")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
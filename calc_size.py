@@ -4,11 +4,11 @@ import os
 from logging import Logger
 from datetime import datetime
 
-import cv2
 from tqdm import tqdm
 
 from settings import BASE_PATH, LOGGING
 from src.logger import init_logger
+from src.video_catalog import VideoCatalog
 
 logger: Logger = init_logger(LOGGING['main'], "[bold cyan]\\[SIZE][/bold cyan]")
 
@@ -19,25 +19,19 @@ def parse_time(t: str) -> float:
         t_obj = datetime.strptime(t, "%H:%M:%S")
     return t_obj.hour * 3600 + t_obj.minute * 60 + t_obj.second + (t_obj.microsecond / 1e6)
 
-def sync_get_frame_size(video_path: str, timecode: str) -> int:
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
+def sync_get_frame_size(catalog: VideoCatalog, video_path: str, timecode: str) -> int:
+    entry = catalog.get(video_path)
+    if entry is None or not entry["readable"]:
         return 0
 
-    seconds = parse_time(timecode)
-    cap.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000)
-    success, frame = cap.read()
-    cap.release()
-
-    if not success or frame is None:
+    if parse_time(timecode) > entry["duration"]:
         return 0
 
-    height, width, channels = frame.shape
-    return height * width * channels
+    return entry["width"] * entry["height"] * 3
 
 from asyncio.exceptions import TimeoutError
 
-async def estimate_size(entry: dict, min_score: float, semaphore: asyncio.Semaphore, progress_callback) -> int:
+async def estimate_size(entry: dict, min_score: float, semaphore: asyncio.Semaphore, progress_callback, catalog: VideoCatalog) -> int:
     score = entry.get('score', 0)
     if score < min_score:
         progress_callback()
@@ -49,7 +43,7 @@ async def estimate_size(entry: dict, min_score: float, semaphore: asyncio.Semaph
     async with semaphore:
         try:
             size = await asyncio.wait_for(
-                asyncio.to_thread(sync_get_frame_size, video_path, timecode),
+                asyncio.to_thread(sync_get_frame_size, catalog, video_path, timecode),
                 timeout=5  # секунд
             )
         except TimeoutError:
@@ -64,8 +58,8 @@ async def estimate_size(entry: dict, min_score: float, semaphore: asyncio.Semaph
 
 
 RESULTS_FILENAME = 'parsed_results.json'
-async def main(min_score: float = 0.4, max_concurrency: int = 12):
-    results_path = os.path.join(BASE_PATH, RESULTS_FILENAME)
+async def main(min_score: float = 0.4, max_concurrency: int = 12, results_filename: str = RESULTS_FILENAME):
+    results_path = os.path.join(BASE_PATH, results_filename)
 
     with open(results_path, 'r') as f:
         results = json.load(f)
@@ -82,12 +76,15 @@ async def main(min_score: float = 0.4, max_concurrency: int = 12):
     def progress():
         pbar.update()
 
+    catalog = VideoCatalog()
+
     tasks = [
-        estimate_size(entry, min_score, semaphore, progress)
+        estimate_size(entry, min_score, semaphore, progress, catalog)
         for entry in all_entries
     ]
 
     sizes = await asyncio.gather(*tasks)
+    catalog.save()
 
     total_estimated_size = sum(sizes)
     total_passed = sum(1 for s in sizes if s > 0)
@@ -100,4 +97,5 @@ async def main(min_score: float = 0.4, max_concurrency: int = 12):
     logger.info(f"Skipped (score < {min_score} or read error): {skipped}")
     logger.info(f"Approx. total size: {estimated_mb:.2f} MB")
 
-asyncio.run(main(min_score=0.45, max_concurrency=12))
+if __name__ == '__main__':
+    asyncio.run(main(min_score=0.45, max_concurrency=12))
@@ -0,0 +1,78 @@
+import asyncio
+
+import click
+
+from settings import ORIGINALS_FOLDER_NAME, COMPARING_FOLDER_NAME
+
+# Commands import their modules on call, so startup only pays for what is used
+
+
+@click.group()
+def cli():
+    """Screenshot Search"""
+
+
+@cli.command()
+@click.option("--originals", default=ORIGINALS_FOLDER_NAME, show_default=True, help="Originals folder name")
+@click.option("--comparing", default=COMPARING_FOLDER_NAME, show_default=True, help="Videos folder name")
+@click.option("--output", default="results.json", show_default=True, help="Results file")
+def search(originals: str, comparing: str, output: str):
+    """Search originals in videos"""
+    import main
+    asyncio.run(main.main(originals, comparing, output))
+
+
+@cli.command()
+@click.option("--results", default="results.json", show_default=True, help="Search results file")
+@click.option("--output", default="parsed_results.json", show_default=True, help="Resolved results file")
+def resolve(results: str, output: str):
+    """Score search results and convert paths"""
+    import resolve_results
+    asyncio.run(resolve_results.main(results, output))
+
+
+@cli.command()
+@click.option("--results", default="parsed_results.json", show_default=True, help="Resolved results file")
+@click.option("--time-threshold-ms", default=1000, show_default=True, help="Results closer than this are duplicates")
+@click.option("--min-score", default=0.5, show_default=True, help="Drop results with lower score")
+def dedupe(results: str, time_threshold_ms: int, min_score: float):
+    """Remove duplicate results"""
+    import remove_duplicate_results
+    remove_duplicate_results.main(results, time_threshold_ms, min_score)
+
+
+@cli.command()
+@click.option("--results", default="results.cleaned.json", show_default=True, help="Cleaned results file")
+@click.option("--min-score", default=0.4, show_default=True, help="Skip results with lower score")
+@click.option("--format", "image_format", type=click.Choice(["jpg", "webp"]), default="jpg", show_default=True)
+@click.option("--quality", default=90, show_default=True, help="Encoding quality (0 - 100)")
+@click.option("--thumbnail-size", type=int, default=None, help="Downscale frames to this max side")
+@click.option("--link-mode", type=click.Choice(["hardlink", "symlink", "copy"]), default="hardlink", show_default=True)
+@click.option("--workers", type=int, default=None, help="Encoding threads")
+def hierarchy(results: str, min_score: float, image_format: str, quality: int,
+              thumbnail_size: int | None, link_mode: str, workers: int | None):
+    """Unpack results into dist folder tree"""
+    import make_result_hierarchy
+    asyncio.run(make_result_hierarchy.main(results, min_score, image_format, quality, thumbnail_size, link_mode, workers))
+
+
+@cli.command()
+@click.option("--results", default="parsed_results.json", show_default=True, help="Resolved results file")
+@click.option("--min-score", default=0.45, show_default=True, help="Skip results with lower score")
+@click.option("--concurrency", default=12, show_default=True, help="Parallel video reads")
+def size(results: str, min_score: float, concurrency: int):
+    """Estimate disk space of result hierarchy"""
+    import calc_size
+    asyncio.run(calc_size.main(min_score, concurrency, results))
+
+
+@cli.command()
+@click.option("--comparing", default=COMPARING_FOLDER_NAME, show_default=True, help="Videos folder name")
+def index(comparing: str):
+    """Build video catalog and cached per-video indexes"""
+    import build_index
+    asyncio.run(build_index.main(comparing))
+
+
+if __name__ == '__main__':
+    cli()
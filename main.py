@@ -4,44 +4,50 @@ import os.path
 from logging import Logger
 
 from settings import LOGGING, ORIGINALS_FOLDER_NAME, BASE_PATH, COMPARING_FOLDER_NAME
+from src.async_search import AsyncSearch
 from src.folder_reader import FolderReader
 from src.logger import init_logger
 from src.search_processor import SearchProcessor
+from src.video_catalog import VideoCatalog
 
 
 logger: Logger = init_logger(LOGGING['main'], "[bold red]\\[CORE][/bold red]")
 
-async def main():
+async def main(originals_folder_name: str = ORIGINALS_FOLDER_NAME,
+               comparing_folder_name: str = COMPARING_FOLDER_NAME,
+               output_filename: str = "results.json"):
     logger.info("[bold cyan]Initializing")
 
-    ORIGINALS_FOLDER = os.path.join(BASE_PATH, ORIGINALS_FOLDER_NAME)
-    COMPARING_FOLDER = os.path.join(BASE_PATH, COMPARING_FOLDER_NAME)
+    ORIGINALS_FOLDER = os.path.join(BASE_PATH, originals_folder_name)
+    COMPARING_FOLDER = os.path.join(BASE_PATH, comparing_folder_name)
 
     os.makedirs(ORIGINALS_FOLDER, exist_ok=True)
     os.makedirs(COMPARING_FOLDER, exist_ok=True)
 
     ORIGINALS: list[str] = FolderReader.walk_files(ORIGINALS_FOLDER)
-    COMPARING: list[str] = FolderReader.walk_files(COMPARING_FOLDER)
+    catalog = VideoCatalog()
+    COMPARING: list[str] = catalog.refresh(COMPARING_FOLDER)
 
     logger.info(f"Found {len(ORIGINALS)} originals files")
     logger.info(f"Found {len(COMPARING)} comparing files")
 
     logger.info("[bold yellow]Starting search")
 
-    search_engine = SearchProcessor(ORIGINALS, COMPARING)
+    search_engine = SearchProcessor(ORIGINALS, COMPARING, catalog)
 
     results = {}
-    async for result in search_engine.search():
-        original_file, comparing_file, protocol, timecode = result
+    async with AsyncSearch(search_engine) as hits:
+        async for result in hits:
+            original_file, comparing_file, protocol, timecode = result
 
-        if results.get(original_file):
-            if timecode.seconds in [i[3].seconds for i in results[original_file]]:
-                continue
+            if results.get(original_file):
+                if (comparing_file, timecode.seconds) in [(i[1], i[3].seconds) for i in results[original_file]]:
+                    continue
 
-            results[original_file].append(result)
-            continue
+                results[original_file].append(result)
+                continue
 
-        results[original_file] = [result]
+            results[original_file] = [result]
 
     all_results = []
     for original_path, founds in results.items():
@@ -53,10 +59,11 @@ async def main():
                 "protocol": protocol
             })
 
-    with open("results.json", "w+", encoding="utf-8") as f:
+    with open(output_filename, "w+", encoding="utf-8") as f:
         json.dump(all_results, f, ensure_ascii=False, indent=4)
 
-    logger.info("[bold green]Done! Results saved to results.json[/bold green]")
+    logger.info(f"[bold green]Done! Results saved to {output_filename}[/bold green]")
 
 
-asyncio.run(main())
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,32 +1,47 @@
 import asyncio
 import json
 import os
+from collections import defaultdict
 from logging import Logger
 
-import cv2
-import numpy as np
 from tqdm import tqdm
 
 from settings import BASE_PATH, LOGGING
+from src.hierarchy_writer import HierarchyWriter
 from src.logger import init_logger
 from src.frame_compiler import FrameCompiler
+from src.video_catalog import VideoCatalog
 
 DIST_BASE_PATH = BASE_PATH
 
 
 PATH_V2 = False  # Dev tool
 
-def save_result(score: float, original_file_name: str, found_file_name: str, timecode: str, image: np.ndarray):
+IMAGE_FORMAT = "jpg"  # jpg or webp
+IMAGE_QUALITY = 90
+THUMBNAIL_SIZE = None  # Max side of saved frames in pixels. None to keep original size
+LINK_MODE = "hardlink"  # hardlink, symlink or copy. Falls back to the next one if not supported
+WORKERS = None  # Encoding threads. None to use all cores
+
+def result_path(score: float, original_file_name: str, found_file_name: str, timecode: str, image_format: str = IMAGE_FORMAT) -> str:
     if PATH_V2:
         folder_path = os.path.join(DIST_BASE_PATH, 'dist', str(original_file_name), str(score) , str(found_file_name))
     else:
         folder_path = os.path.join(DIST_BASE_PATH, 'dist', str(score), str(original_file_name), str(found_file_name))
-    os.makedirs(folder_path, exist_ok=True)
 
     safe_timecode = timecode.replace(":", "-")
-    file_path = os.path.join(folder_path, safe_timecode + '.jpg')
+    return os.path.join(folder_path, safe_timecode + '.' + image_format)
+
 
-    cv2.imwrite(file_path, image)
+def save_frames(frame_compiler: FrameCompiler, writer: HierarchyWriter, frame_indexes: list[int], targets: dict[int, list[str]], pbar: tqdm):
+    read = set()
+    for frame_index, frame in frame_compiler.get_frames(frame_indexes):
+        writer.submit(frame_compiler.video_path, frame_index, frame, targets[frame_index])
+        pbar.update(len(targets[frame_index]))
+        read.add(frame_index)
+
+    for frame_index in set(frame_indexes) - read:
+        pbar.update(len(targets[frame_index]))
 
 
 logger: Logger = init_logger(LOGGING['main'], "[bold red]\\[CORE][/bold red]")
@@ -34,50 +49,78 @@ logger: Logger = init_logger(LOGGING['main'], "[bold red]\\[CORE][/bold red]")
 RESULTS_FILENAME = 'results.cleaned.json'
 MIN_SCORE = 0.4
 
-async def main():
+async def main(results_filename: str = RESULTS_FILENAME,
+               min_score: float = MIN_SCORE,
+               image_format: str = IMAGE_FORMAT,
+               quality: int = IMAGE_QUALITY,
+               thumbnail_size: int | None = THUMBNAIL_SIZE,
+               link_mode: str = LINK_MODE,
+               workers: int | None = WORKERS):
     if os.path.exists(os.path.join(DIST_BASE_PATH, 'dist')):
-        raise RuntimeError(f"Dist already exists on {BASE_PATH}")
+        logger.info(f"Dist already exists on {BASE_PATH}, resuming")
 
-    RESULTS_PARSED_PATH = os.path.join(BASE_PATH, RESULTS_FILENAME)
+    RESULTS_PARSED_PATH = os.path.join(BASE_PATH, results_filename)
 
     logger.info(f"Results file: {RESULTS_PARSED_PATH}")
 
     with open(RESULTS_PARSED_PATH, 'r') as f:
         results = json.load(f)
 
-    total = sum(len(results[k]) for k in results)
-    pbar = tqdm(total=total, desc="Saving matched frames")
-
+    # video -> [result]. Frames of every video are read in one pass
+    by_video: dict[str, list[dict]] = defaultdict(list)
     for protocol in results:
         for result in results[protocol]:
-            if result['score'] < MIN_SCORE:
-                pbar.update()
+            if result['score'] < min_score:
                 continue
 
-            found_path = result['found_path']
-            timecode = result['time']
-
-            if not os.path.exists(found_path):
-                pbar.update()
+            if not os.path.exists(result['found_path']):
                 continue
 
-            async with FrameCompiler(found_path) as frame_compiler:
-                frame = await asyncio.to_thread(frame_compiler.get_frame_at_time, timecode)
-                if frame is None:
-                    pbar.update()
-                    continue
+            by_video[result['found_path']].append(result)
 
-                save_result(
-                    score=round(result['score'], 4),
-                    original_file_name=os.path.basename(result['original_path']),
-                    found_file_name=os.path.basename(found_path),
-                    timecode=timecode,
-                    image=np.array(frame)
-                )
+    total = sum(len(v) for v in by_video.values())
+    pbar = tqdm(total=total, desc="Saving matched frames")
 
-            pbar.update()
+    writer = HierarchyWriter(
+        os.path.join(DIST_BASE_PATH, 'dist'),
+        image_format=image_format,
+        quality=quality,
+        thumbnail_size=thumbnail_size,
+        link_mode=link_mode,
+        workers=workers
+    )
+
+    catalog = VideoCatalog()
+
+    with writer:
+        for found_path, video_results in by_video.items():
+            async with FrameCompiler(found_path, catalog.get(found_path)) as frame_compiler:
+                # frame index -> target paths. Same frame is stored once for all originals and scores
+                targets: dict[int, list[str]] = defaultdict(list)
+                for result in video_results:
+                    frame_index = frame_compiler.frame_index_at_time(result['time'])
+                    targets[frame_index].append(result_path(
+                        score=round(result['score'], 4),
+                        original_file_name=os.path.basename(result['original_path']),
+                        found_file_name=os.path.basename(found_path),
+                        timecode=result['time'],
+                        image_format=image_format
+                    ))
+
+                pending = []
+                for frame_index, frame_targets in targets.items():
+                    if writer.link_existing(found_path, frame_index, frame_targets):
+                        pbar.update(len(frame_targets))
+                        continue
+
+                    pending.append(frame_index)
+
+                # Frames are read in one ordered pass, seeking only between GOPs
+                await asyncio.to_thread(save_frames, frame_compiler, writer, pending, targets, pbar)
 
     pbar.close()
+    catalog.save()
 
 
-asyncio.run(main())
+if __name__ == '__main__':
+    asyncio.run(main())
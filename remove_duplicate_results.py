@@ -30,8 +30,10 @@ def result_key(result: dict) -> tuple:
 def get_time_ms(result: dict) -> int:
     return parse_time_to_ms(result["time"])
 
-def main():
-    RESULTS_PARSED_PATH = os.path.join(BASE_PATH, RESULTS_FILENAME)
+def main(results_filename: str = RESULTS_FILENAME,
+         time_threshold_ms: int = TIME_THRESHOLD_MS,
+         min_score: float = MIN_SCORE):
+    RESULTS_PARSED_PATH = os.path.join(BASE_PATH, results_filename)
     RESULTS_CLEANED_PATH = os.path.join(BASE_PATH, 'results.cleaned.json')
 
     logger.info(f"Results file: {RESULTS_PARSED_PATH}")
@@ -52,7 +54,7 @@ def main():
         grouped_by_key = defaultdict(list)
 
         for result in entries:
-            if result['score'] < MIN_SCORE:
+            if result['score'] < min_score:
                 pbar.update()
                 low_scores_removed += 1
                 continue
@@ -70,7 +72,7 @@ def main():
                 else:
                     prev = deduped[-1]
                     prev_time_ms = get_time_ms(prev)
-                    if abs(time_ms - prev_time_ms) < TIME_THRESHOLD_MS:
+                    if abs(time_ms - prev_time_ms) < time_threshold_ms:
                         if r["score"] > prev["score"]:
                             deduped[-1] = r
                             duplicates_removed += 1
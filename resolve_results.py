@@ -12,10 +12,11 @@ from src.frame_compiler import FrameCompiler
 from src.logger import init_logger
 from settings import BASE_PATH, LOGGING, ORIGINALS_FOLDER_NAME, COMPARING_FOLDER_NAME, PROTOCOLS
 from src.match_processor import FrameMatchProcessor
+from src.video_catalog import VideoCatalog
 
 logger: Logger = init_logger(LOGGING['main'], "[bold red]\\[CORE][/bold red]")
 
-async def process_result(result: dict) -> list[dict]:
+async def process_result(result: dict, catalog: VideoCatalog) -> list[dict]:
     ORIGINAL = result['original_path']
     FOUND_VIDEO = result['found_path']
     TIMECODE = result['time']
@@ -26,7 +27,9 @@ async def process_result(result: dict) -> list[dict]:
     if not os.path.exists(FOUND_VIDEO) or not os.path.exists(ORIGINAL):
         return []
 
-    async with FrameCompiler(FOUND_VIDEO) as frame_compiler:
+    metadata = await asyncio.to_thread(catalog.get, FOUND_VIDEO)
+
+    async with FrameCompiler(FOUND_VIDEO, metadata) as frame_compiler:
         frame = await asyncio.to_thread(frame_compiler.get_frame_at_time, TIMECODE)
         frame = np.array(frame)
 
@@ -36,29 +39,14 @@ async def process_result(result: dict) -> list[dict]:
 
     match_processor = FrameMatchProcessor(original_frame, frame)
 
-    score: dict[str,  float | None] = {
-        "SSIM": None,
-        "PHASH": None,
-        "TEMPLATE": None,
-    }
-
-    if PROTOCOLS["ssim"]["use"]:
-        score["SSIM"] = await asyncio.to_thread(
-            match_processor.compare_ssim,
-            PROTOCOLS["ssim"]["similarity"],
-            True
-        )
-    if PROTOCOLS["phash"]["use"]:
-        score["PHASH"] = await asyncio.to_thread(
-            match_processor.compare_phash,
-            PROTOCOLS["phash"]["similarity"],
-            True
-        )
-    if PROTOCOLS["template"]["use"]:
-        score["TEMPLATE"] = await asyncio.to_thread(
-            match_processor.compare_template,
-            PROTOCOLS["template"]["similarity"],
-            True
+    score: dict[str, float] = {}
+    for protocol, options in PROTOCOLS.items():
+        if not options["use"]:
+            continue
+
+        score[protocol.upper()] = await asyncio.to_thread(
+            match_processor.protocol(protocol).raw_score,
+            frame
         )
 
     output = []
@@ -74,13 +62,13 @@ async def process_result(result: dict) -> list[dict]:
 
 RESULTS_FILENAME = "results.json"
 
-async def main():
+async def main(results_filename: str = RESULTS_FILENAME, output_filename: str = "parsed_results.json"):
     logger.info("[bold cyan]Initializing result resolver")
 
-    RESULTS_PATH = os.path.join(BASE_PATH, RESULTS_FILENAME)
+    RESULTS_PATH = os.path.join(BASE_PATH, results_filename)
 
     logger.info(f"Results file: {RESULTS_PATH}")
-    logger.info(f"Output: parsed_results.json")
+    logger.info(f"Output: {output_filename}")
 
     if not os.path.exists(RESULTS_PATH):
         logger.error(f"Result file not found in {RESULTS_PATH}")
@@ -113,10 +101,11 @@ async def main():
     logger.info("[cyan]Comparing search results (This will take a while)")
 
     sem = asyncio.Semaphore(4)
+    catalog = VideoCatalog()
 
     async def limited_task(r):
         async with sem:
-            return await process_result(r)
+            return await process_result(r, catalog)
 
     tasks = [limited_task(r) for r in results]
 
@@ -125,6 +114,8 @@ async def main():
         res = await coro
         all_results.extend(res)
 
+    catalog.save()
+
     compared_results = {}
     for item in all_results:
         protocol = item["score_protocol"]
@@ -132,9 +123,10 @@ async def main():
 
     logger.info("[green]Comparing search results finished successfully. Dumping results")
 
-    with open("parsed_results.json", "w+") as f:
+    with open(output_filename, "w+") as f:
         json.dump(compared_results, f, indent=4)
 
     logger.info("[green]Done!")
 
-asyncio.run(main())
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -24,9 +24,74 @@ PROTOCOLS = {
     },
     "template": {
         "similarity": 0.395,
-        "use": True
+        "use": True,
+        "tracking": True,  # After a match, search next frames only around the match location
+        "tracking_padding": 32  # Pixels around the last match location to search in
+    },
+    "features": {
+        "similarity": 0.1,  # Share of keypoints in matched frame region, which are inliers
+        "use": False,
+        "detector": "orb",  # orb or akaze
+        "max_features": 1000,
+        "frame_step": 5  # Match only every n-th frame
     }
 }
 
+CLUSTER_ORIGINALS = {
+    "use": False,
+    "max_distance": 6,  # Max PHash distance (out of 64) between near-duplicate originals
+    "threshold_relax": 0.05  # Cluster representative is searched with threshold lowered by this value
+}
+
+PREFILTER = {
+    "use": False,
+    "sample_interval": 1.0,  # Seconds between frames sampled into video summary
+    "keep_ratio": 0.25,  # Always scan this share of best ranked videos. Higher = better recall, slower
+    "min_score": 0.8  # Also scan every video scored at least this [0..1]
+}
+
+SHOT_SEARCH = {
+    "use": False,
+    "cut_threshold": 0.4,  # Histogram distance between consecutive frames [0..1], considered a scene cut
+    "representatives": 3,  # Frames per shot matched first
+    "margin": 0.1  # Shot is scanned frame by frame if any representative scores above (similarity - margin)
+}
+
+QUERY = {
+    "mode": "all",  # all, top_k or first_hit
+    "k": 5,  # Best hits per original to keep in top_k mode
+    "certain_score": None,  # top_k mode: stop searching original after a hit with this score
+    "per_video_cap": None  # Max hits per original in one video. None for no limit
+}
+
+LIBRARY_DEDUP = {
+    "use": False,
+    "interval": 0.5,  # Seconds between frames sampled into video signature
+    "signature_seconds": 300,  # Length of video start to sample
+    "max_offset": 10,  # Max time shift between duplicate videos in seconds
+    "max_distance": 10,  # Max DHash distance (out of 64) between matching frames
+    "min_match_ratio": 0.8,  # Share of sampled frames, which must match
+    "duration_tolerance": 15  # Max duration difference of duplicate videos in seconds
+}
+
+CALIBRATION = {
+    "use": False,
+    "sample_frames": 300,  # Random library frames every original is scored against
+    "z_score": 5.0,  # Threshold = median + z_score * std of scores of these frames
+    "false_positive_rate": None,  # If set (e.g. 0.01), threshold is a score only this share of random frames reach
+    "raise_only": True  # Never go below protocol similarity
+}
+
+RESOURCE_BUDGET = {
+    "use": False,
+    "ram_mb": 4096,  # Originals are loaded in groups within this, usage above it is reported
+    "temp_disk_mb": 20480,  # Frame buffering (BUFFER_IMAGES) is refused if it would exceed this
+    "frame_queue_mb": 256,  # Decoded frames held in read-ahead and encoding queues
+    "original_max_side": 1280  # Downscale originals to this, if all enabled protocols are scale invariant. None to keep
+}
+
+CACHE_FOLDER_NAME = "cache"
+SCAN_WORKERS = 8  # Parallel folder scans and video probes
+
 
 BASE_PATH = os.path.abspath(os.path.dirname(__file__))
\ No newline at end of file
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from logging import Logger
+
+from settings import LOGGING
+from src.cancellation import SearchCancelled
+from src.logger import init_logger
+from src.query_state import Hit
+from src.search_processor import SearchProcessor
+
+
+class AsyncSearch:
+    """
+    Non-blocking search for applications with their own event loop.
+    SearchProcessor runs in a dedicated worker thread with its own event loop, so decoding and matching never block
+    the caller loop. Hits are delivered through a bounded queue: when the consumer is slow, the worker waits for it.
+    Every search has its own thread, so several searches can run in one loop.
+
+    async with AsyncSearch(processor) as hits:
+        async for original_path, compare_path, protocol, timecode in hits:
+            ...
+
+    Leaving the context (or cancel()) stops the worker after the current frame or indexing step
+    """
+
+    logger: Logger = init_logger(LOGGING['search_processor'], "[bold yellow]\\[ASYNC-SEARCH][/bold yellow]")
+
+    _done = object()  # End of results marker
+
+    def __init__(self, processor: SearchProcessor, max_pending: int = 64):
+        """
+        :param processor: Search processor, must not be used by anything else while the search is running
+        :param max_pending: Max hits waiting for the consumer before the worker is paused
+        """
+        self.processor = processor
+        self.max_pending = max_pending
+
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.queue: asyncio.Queue | None = None
+        self.finished: asyncio.Future | None = None
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """
+        Start worker thread. Must be called from the consumer event loop
+        """
+        if self.thread is not None:
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.max_pending)
+        self.finished = self.loop.create_future()
+
+        self.thread = threading.Thread(target=self.run, name="search-worker", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        """
+        Worker thread body
+        """
+        try:
+            asyncio.run(self.produce())
+        finally:
+            try:
+                self.loop.call_soon_threadsafe(self._finish)
+            except RuntimeError:
+                pass  # Consumer loop is already closed
+
+    def _finish(self) -> None:
+        if not self.finished.done():
+            self.finished.set_result(None)
+
+    async def produce(self) -> None:
+        """
+        Run search and pass results to the consumer loop
+        """
+        try:
+            async for hit in self.processor.search():
+                if not self.put(hit):
+                    return
+        except SearchCancelled:
+            return
+        except Exception as e:
+            self.put(e)
+            return
+
+        self.put(self._done)
+
+    def put(self, item) -> bool:
+        """
+        Put item into the consumer queue, waiting while it is full
+        :return: False if search was cancelled or consumer loop is gone
+        """
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop)
+        except RuntimeError:
+            return False  # Consumer loop is closed
+
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except FutureTimeoutError:
+                if self.processor.cancelled.is_set():
+                    future.cancel()
+                    return False
+
+    def __aiter__(self):
+        self.start()
+        return self
+
+    async def __anext__(self) -> Hit:
+        item = await self.queue.get()
+
+        if item is self._done:
+            self.queue.put_nowait(item)  # Later calls end too
+            raise StopAsyncIteration
+
+        if isinstance(item, Exception):
+            raise item
+
+        return item
+
+    async def cancel(self) -> None:
+        """
+        Stop search and wait for the worker to exit
+        """
+        if self.thread is None:
+            return
+
+        self.processor.cancel()
+        await self.finished
+        self.logger.debug("Search stopped")
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.cancel()
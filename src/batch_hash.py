@@ -0,0 +1,96 @@
+from functools import cache
+from typing import Sequence
+
+import cv2
+import numpy as np
+
+
+class BatchHasher:
+    """
+    Perceptual hashing of frame stacks.
+    Frames are converted to gray and downscaled with OpenCV, then hashed together with NumPy matrix products.
+    Hashes are close to imagehash ones (PIL Lanczos is replaced by area resampling), but not bit exact,
+    so distance thresholds tuned for imagehash keep their meaning only approximately.
+    Hashes are returned as uint64 arrays, bits in imagehash order
+    """
+
+    HASH_SIZE = 8
+    HIGHFREQ_FACTOR = 4  # PHash image size = HASH_SIZE * HIGHFREQ_FACTOR
+
+    @staticmethod
+    def gray_stack(frames: Sequence[np.ndarray], size: tuple[int, int]) -> np.ndarray:
+        """
+        Convert BGR frames to resized gray stack
+        :param frames: BGR (or gray) frames of any size
+        :param size: Target (width, height)
+        :return: float64 array of shape (n, height, width)
+        """
+        stack = np.empty((len(frames), size[1], size[0]), dtype=np.float64)
+        for i, frame in enumerate(frames):
+            gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            stack[i] = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+        return stack
+
+    @staticmethod
+    def pack(bits: np.ndarray) -> np.ndarray:
+        """
+        Pack boolean hashes of shape (n, 8, 8) to uint64
+        """
+        packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+        return packed.view(">u8").ravel().astype(np.uint64)
+
+    @staticmethod
+    @cache
+    def dct_matrix(size: int, rows: int) -> np.ndarray:
+        """
+        First rows of unnormalized DCT-II matrix (same scaling as scipy.fftpack.dct, used by imagehash)
+        """
+        k = np.arange(rows)[:, None]
+        n = np.arange(size)[None, :]
+        return 2 * np.cos(np.pi * k * (2 * n + 1) / (2 * size))
+
+    @classmethod
+    def phash(cls, frames: Sequence[np.ndarray]) -> np.ndarray:
+        if not len(frames):
+            return np.empty(0, dtype=np.uint64)
+
+        img_size = cls.HASH_SIZE * cls.HIGHFREQ_FACTOR
+        pixels = cls.gray_stack(frames, (img_size, img_size))
+
+        # Only low frequencies are used, so only first HASH_SIZE DCT rows are computed
+        dct = cls.dct_matrix(img_size, cls.HASH_SIZE)
+        low_frequencies = dct @ pixels @ dct.T
+
+        medians = np.median(low_frequencies.reshape(len(frames), -1), axis=1)
+        return cls.pack(low_frequencies > medians[:, None, None])
+
+    @classmethod
+    def dhash(cls, frames: Sequence[np.ndarray]) -> np.ndarray:
+        if not len(frames):
+            return np.empty(0, dtype=np.uint64)
+
+        pixels = cls.gray_stack(frames, (cls.HASH_SIZE + 1, cls.HASH_SIZE))
+        return cls.pack(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+    @classmethod
+    def ahash(cls, frames: Sequence[np.ndarray]) -> np.ndarray:
+        if not len(frames):
+            return np.empty(0, dtype=np.uint64)
+
+        pixels = cls.gray_stack(frames, (cls.HASH_SIZE, cls.HASH_SIZE))
+        averages = pixels.reshape(len(frames), -1).mean(axis=1)
+        return cls.pack(pixels > averages[:, None, None])
+
+    @staticmethod
+    def hamming(a: np.ndarray | int, b: np.ndarray | int) -> np.ndarray:
+        """
+        Bit distances between uint64 hashes (broadcasted)
+        """
+        xor = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(xor).astype(np.int64)
+
+        flat = np.ascontiguousarray(xor).reshape(-1, 1)
+        return np.unpackbits(flat.view(np.uint8), axis=1).sum(axis=1).reshape(xor.shape)
@@ -0,0 +1,16 @@
+import threading
+
+
+class SearchCancelled(Exception):
+    """
+    Raised by long running steps (indexing, summaries, calibration) when search is cancelled
+    """
+
+
+def check_cancelled(cancelled: threading.Event | None) -> None:
+    """
+    Raise SearchCancelled if event is set
+    :param cancelled: Cancellation event, None if step can't be cancelled
+    """
+    if cancelled is not None and cancelled.is_set():
+        raise SearchCancelled()
@@ -0,0 +1,122 @@
+from typing import Literal
+
+import cv2
+import numpy as np
+
+
+class FeatureIndex:
+    """
+    Keypoint descriptors of an original, extracted once and indexed with FLANN LSH.
+    Frames are matched against the index and verified with RANSAC homography,
+    so cropped and rescaled originals are found too
+    """
+
+    FLANN_INDEX_LSH = 6
+    MIN_MATCHES = 8  # Homography needs at least 4 points, use more for stable results
+    RATIO = 0.75  # Lowe's ratio test
+    MIN_INLIERS = 10  # Fewer inliers are found in unrelated frames by chance
+
+    def __init__(self, original: np.ndarray, detector: Literal["orb", "akaze"] = "orb", max_features: int = 1000):
+        """
+        :param original: Original image (BGR)
+        :param detector: Keypoint detector. Both produce binary descriptors
+        :param max_features: Max keypoints per image (ORB only)
+        """
+        self.detector = self.create_detector(detector, max_features)
+
+        gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
+        self.shape = gray.shape
+        self.keypoints, self.descriptors = self.detector.detectAndCompute(gray, None)
+
+        self.matcher = cv2.FlannBasedMatcher(
+            dict(algorithm=self.FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1),
+            dict(checks=50)
+        )
+        if self.descriptors is not None and len(self.keypoints) >= self.MIN_MATCHES:
+            self.matcher.add([self.descriptors])
+            self.matcher.train()
+
+    @staticmethod
+    def create_detector(detector: str, max_features: int):
+        if detector == "orb":
+            return cv2.ORB_create(nfeatures=max_features)
+        if detector == "akaze":
+            return cv2.AKAZE_create()
+
+        raise ValueError(f"Unsupported feature detector: {detector}")
+
+    @property
+    def is_empty(self) -> bool:
+        return self.descriptors is None or len(self.keypoints) < self.MIN_MATCHES
+
+    def score(self, frame: np.ndarray) -> float:
+        """
+        Score frame against original
+        :param frame: Frame (BGR)
+        :return: Inliers as a share of frame keypoints in the region original is mapped onto
+            (or of original keypoints, if there are fewer) [0..1]
+        """
+        if self.is_empty:
+            return 0.0
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame_keypoints, frame_descriptors = self.detector.detectAndCompute(gray, None)
+        if frame_descriptors is None or len(frame_keypoints) < self.MIN_MATCHES:
+            return 0.0
+
+        good = []
+        for pair in self.matcher.knnMatch(frame_descriptors, k=2):
+            if len(pair) == 2 and pair[0].distance < self.RATIO * pair[1].distance:
+                good.append(pair[0])
+
+        if len(good) < self.MIN_MATCHES:
+            return 0.0
+
+        original_points = np.float32([self.keypoints[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+        frame_points = np.float32([frame_keypoints[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+
+        homography, mask = cv2.findHomography(original_points, frame_points, cv2.RANSAC, 5.0)
+        if homography is None:
+            return 0.0
+
+        # Several frame keypoints can match the same original keypoint, count it once
+        inliers = {m.trainIdx for m, inlier in zip(good, mask.ravel()) if inlier}
+        if len(inliers) < self.MIN_INLIERS:
+            return 0.0
+
+        # Frame keypoints cover the whole frame, but a cropped original is only a part of it.
+        # Compare with keypoints, which could be found at all: frame keypoints in the region the original is mapped onto
+        region_keypoints = self.region_keypoints(homography, frame_keypoints, gray.shape)
+        if region_keypoints is None:
+            return 0.0
+
+        return len(inliers) / max(len(inliers), min(len(self.keypoints), region_keypoints))
+
+    def region_keypoints(self, homography: np.ndarray, frame_keypoints, frame_shape: tuple[int, int]) -> int | None:
+        """
+        Count frame keypoints inside the region, which homography maps original onto
+        :param homography: Original to frame homography
+        :param frame_keypoints: Frame keypoints
+        :param frame_shape: Frame height and width
+        :return: Keypoint count, or None if region is degenerate (not a convex quadrilateral)
+        """
+        h, w = self.shape
+        corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        region = cv2.perspectiveTransform(corners, homography).reshape(-1, 2)
+        if not np.isfinite(region).all() or not cv2.isContourConvex(region):
+            return None
+
+        # Only the part of region inside frame can contain keypoints
+        frame_h, frame_w = frame_shape
+        frame_rect = np.float32([[0, 0], [frame_w, 0], [frame_w, frame_h], [0, frame_h]])
+        area, visible = cv2.intersectConvexConvex(region.astype(np.float32), frame_rect)
+        if area <= 0 or visible is None:
+            return 0
+
+        mask = np.zeros(frame_shape, np.uint8)
+        cv2.fillConvexPoly(mask, np.round(visible.reshape(-1, 2)).astype(np.int32), 1)
+
+        points = np.float32([kp.pt for kp in frame_keypoints])
+        xs = np.clip(np.round(points[:, 0]).astype(int), 0, frame_w - 1)
+        ys = np.clip(np.round(points[:, 1]).astype(int), 0, frame_h - 1)
+        return int(mask[ys, xs].sum())
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 
 class FolderReader:
@@ -12,6 +13,41 @@ class FolderReader:
 
         return found_files
 
+    @staticmethod
+    def scan_files(path: str, workers: int = 8) -> list[tuple[str, int, float]]:
+        """
+        Walk folder tree, scanning directories in parallel
+        :param path: Folder path
+        :param workers: Parallel directory scans
+        :return: Sorted list of [absolute path, size, mtime] of every file
+        """
+        def scan(directory: str) -> tuple[list[str], list[tuple[str, int, float]]]:
+            directories, files = [], []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            files.append((os.path.abspath(entry.path), stat.st_size, stat.st_mtime))
+            except OSError:
+                pass  # Unreadable directory
+
+            return directories, files
+
+        found_files = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(scan, path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directories, files = future.result()
+                    found_files.extend(files)
+                    pending |= {executor.submit(scan, d) for d in directories}
+
+        return sorted(found_files)
+
     @staticmethod
     def convert_path(search_folder_prefix: str, old_path) -> str | None:
         """
@@ -1,11 +1,13 @@
+import asyncio
 import base64
+import itertools
 import os.path
 import re
-import shutil
+import threading
 from datetime import datetime
 from functools import cached_property
 from logging import Logger
-from typing import Generator, AsyncGenerator, Any
+from typing import Generator, AsyncGenerator, Any, Iterable, Iterator
 
 import cv2
 import numpy as np
@@ -13,7 +15,11 @@ from PIL import Image
 from tqdm import tqdm
 
 from settings import LOGGING, BUFFER_IMAGES, BASE_PATH, CLEAR_TEMP
+from src.cancellation import check_cancelled
 from src.logger import init_logger
+from src.resource_budget import ResourceBudget
+from src.seek_index import SeekIndex
+from src.video_cache import VideoCache
 
 
 class FrameCompiler:
@@ -26,16 +32,34 @@ class FrameCompiler:
 
     vidcap: cv2.VideoCapture
     temp_path: str
+    buffer_path: str
 
-    def __init__(self, video_path: str):
+    READ_BATCH = 8  # Frames decoded per worker thread call, lowered to fit frame queue budget
+
+    def __init__(self, video_path: str, metadata: dict | None = None, cancelled: threading.Event | None = None):
+        """
+        :param video_path: Video path
+        :param metadata: Video catalog entry. If passed, frame count and fps are not read from video
+        :param cancelled: If set, long scans (seek index, shot detection) stop with SearchCancelled
+        """
         self.video_path = video_path
+        self.cancelled = cancelled
+
+        if metadata and metadata.get("readable"):
+            self.total_frames = metadata["frame_count"]
+            self.fps = metadata["fps"]
 
     async def __aenter__(self):
-        self.vidcap = cv2.VideoCapture(self.video_path)
+        self.vidcap = await asyncio.to_thread(cv2.VideoCapture, self.video_path)
 
         self.temp_path = os.path.join(BASE_PATH, 'temp')
         os.makedirs(self.temp_path, exist_ok=True)
-        await self.clear_temp()
+
+        # Buffers, which are cleared after use, are private, so concurrent searches don't remove each other's frames
+        self.buffer_path = os.path.join(self.temp_path, self.encode_path(self.video_path))
+        if CLEAR_TEMP:
+            await asyncio.to_thread(ResourceBudget.remove_temp, self.temp_path, self.buffer_path)  # Left from previous starts
+            self.buffer_path += f".{os.getpid()}-{id(self)}"
 
         if BUFFER_IMAGES:
             await self.buffer_frames()
@@ -45,6 +69,7 @@ class FrameCompiler:
 
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await asyncio.to_thread(self.vidcap.release)
         await self.clear_temp()
         return None
 
@@ -56,12 +81,22 @@ class FrameCompiler:
     def fps(self):
         return self.vidcap.get(cv2.CAP_PROP_FPS)
 
+    @cached_property
+    def seek_index(self) -> SeekIndex:
+        return SeekIndex.load_or_build(self.video_path, self.cancelled)
+
+    async def load_seek_index(self) -> SeekIndex:
+        """
+        Load or build seek index in a worker thread
+        """
+        return await asyncio.to_thread(lambda: self.seek_index)
+
     async def clear_temp(self):
         if not CLEAR_TEMP:
             return
 
         self.logger.debug("Clearing temp files")
-        shutil.rmtree(self.temp_path)
+        await asyncio.to_thread(ResourceBudget.remove_temp, self.temp_path, self.buffer_path)
 
     def encode_path(self, path: str) -> str:
         """
@@ -87,21 +122,26 @@ class FrameCompiler:
 
     async def buffer_frames(self) -> None:
         """
-        Buffer all frames to the temp dir
+        Buffer all frames to the temp dir.
+        Frames are written into a private folder, which is renamed into place when complete,
+        so other searches never read a partial buffer
         :return: None
         """
         buffering_pbar = tqdm(total=self.total_frames,
                               desc=f"Buffering frames",
                               leave=False)
-        safe_path = self.encode_path(self.video_path)
-        path = os.path.join(self.temp_path, safe_path)
 
-        if os.path.exists(path):
-            if len(os.listdir(path)) >= self.total_frames:
+        if os.path.exists(self.buffer_path):
+            if len(await asyncio.to_thread(os.listdir, self.buffer_path)) >= self.total_frames:
                 return
 
-            self.logger.debug(f"[bold yellow]Detected existing buffer, but not frames are captured. Removing tree ({path})")
-            shutil.rmtree(path)
+            self.logger.debug(f"[bold yellow]Detected existing buffer, but not frames are captured. Removing tree ({self.buffer_path})")
+            await asyncio.to_thread(ResourceBudget.remove_temp, self.temp_path, self.buffer_path)
+
+        path = f"{self.buffer_path}.{os.getpid()}-{threading.get_ident()}.part"
+
+        available = ResourceBudget.temp_available(self.temp_path)
+        written = 0
 
         findx = -1
         async for findx, frame in self.read_frames():
@@ -110,26 +150,54 @@ class FrameCompiler:
 
             image = Image.fromarray(frame)
             try:
-                image.save(frame_path, format="JPEG", quality=85)
+                await asyncio.to_thread(image.save, frame_path, format="JPEG", quality=85)
             except OSError as e:
                 if e.errno == 28:
                     self.logger.error(f"[bold red]Not enough space on disk! Unable to use buffer for {self.video_path}")
-                    shutil.rmtree(path)
+                    await self.drop_buffer(path)
                     return
                 else:
                     raise
+
+            if available is not None:
+                frame_size = os.path.getsize(frame_path)
+                ResourceBudget.track_temp(self.temp_path, frame_size)
+                written += frame_size
+                # Estimate by average frame size, so buffering stops before the budget is used up
+                if written / findx * self.total_frames > available:
+                    self.logger.warning(
+                        f"[bold yellow]Buffer of {self.video_path} does not fit temp disk budget, reading frames directly"
+                    )
+                    await self.drop_buffer(path)
+                    return
+
             buffering_pbar.update()
 
         buffering_pbar.close()
+
+        try:
+            await asyncio.to_thread(os.replace, path, self.buffer_path)
+        except OSError:
+            # Other search has buffered this video meanwhile
+            await asyncio.to_thread(ResourceBudget.remove_temp, self.temp_path, path)
+
         self.logger.debug(f"Buffered {findx + 1} frames successfully")
 
+    async def drop_buffer(self, path: str) -> None:
+        """
+        Remove incomplete buffer and rewind video, so frames are read directly
+        :param path: Buffer folder
+        """
+        await asyncio.to_thread(ResourceBudget.remove_temp, self.temp_path, path)
+        self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
     async def read_buffer(self):
         """
         Read and iterate buffered frames if available
         Yields a tuple of [frameNumber, frameArray]
         :return: Generator
         """
-        buffering_path = os.path.join(self.temp_path, self.encode_path(self.video_path))
+        buffering_path = self.buffer_path
         if not os.path.exists(buffering_path):
             self.logger.warning(f"No buffer found for {self.video_path}. Reading frames")
             async for fix, f in self.read_frames():
@@ -138,7 +206,7 @@ class FrameCompiler:
 
         self.logger.debug("Yielding buffered frames")
 
-        files = [f for f in os.listdir(buffering_path) if f.endswith('.jpg')]
+        files = [f for f in await asyncio.to_thread(os.listdir, buffering_path) if f.endswith('.jpg')]
 
         def extract_frame_number(filename: str) -> int:
             match = re.search(r'(\d+)', filename)
@@ -150,28 +218,188 @@ class FrameCompiler:
             frame_number = int(re.search(r'(\d+)', filename).group(1))
             file_path = os.path.join(buffering_path, filename)
 
-            image = Image.open(file_path).convert("RGB")
-            frame_array = np.array(image)
+            frame_array = await asyncio.to_thread(self.load_buffered_frame, file_path)
 
             yield frame_number, frame_array
 
+    @staticmethod
+    def load_buffered_frame(file_path: str) -> np.ndarray:
+        with Image.open(file_path) as image:
+            return np.array(image.convert("RGB"))
+
+    def read_batch(self, count: int) -> list[np.ndarray]:
+        """
+        Read next frames of video
+        :param count: Max frames count
+        :return: Frames. Less than count at the end of video
+        """
+        frames = []
+        for _ in range(count):
+            success, frame = self.vidcap.read()
+            if not success:
+                break
+            frames.append(frame)
+
+        return frames
+
     async def read_frames(self):
         """
         Read and iterate video frames.
-        Does not use buffering
+        Does not use buffering. Frames are decoded in a worker thread, so the event loop is not blocked
         Yields a tuple of [frameNumber, frameArray]
         :return: Generator
         """
+        frame_count = 0
+        batch_size = 1  # First frame tells frame size
+
+        while True:
+            frames = await asyncio.to_thread(self.read_batch, batch_size)
+
+            for frame in frames:
+                frame_count += 1
+                yield frame_count, frame
 
-        success, frame = self.vidcap.read()
+            if len(frames) < batch_size:
+                break
+
+            batch_size = ResourceBudget.frame_slots(frames[0].nbytes, self.READ_BATCH)
+
+    async def drain(self, frames: Iterator[tuple[int, np.ndarray]]):
+        """
+        Iterate blocking frame generator, running it in a worker thread in batches,
+        so the event loop is not blocked
+        Yields a tuple of [frameNumber, frameArray]
+        :param frames: Sync generator of [frameNumber, frameArray]
+        :return: Generator
+        """
+        batch_size = 1  # First frame tells frame size
+
+        while True:
+            batch = await asyncio.to_thread(list, itertools.islice(frames, batch_size))
+
+            for item in batch:
+                yield item
+
+            if len(batch) < batch_size:
+                return
+
+            batch_size = ResourceBudget.frame_slots(batch[0][1].nbytes, self.READ_BATCH)
+
+    async def sample_frames(self, step: int):
+        """
+        Read every n-th video frame.
+        Skipped frames are only grabbed, not retrieved
+        Yields a tuple of [frameNumber, frameArray]
+        :param step: Distance between sampled frames
+        :return: Generator
+        """
+        async for frame_number, frame in self.drain(self.iterate_samples(step)):
+            yield frame_number, frame
+
+    def iterate_samples(self, step: int) -> Generator[tuple[int, np.ndarray], None, None]:
+        step = max(1, step)
         frame_count = 0
 
-        while success:
+        while self.vidcap.grab():
             frame_count += 1
 
+            if (frame_count - 1) % step:
+                continue
+
+            success, frame = self.vidcap.retrieve()
+            if not success:
+                break
+
             yield frame_count, frame
 
+    async def read_range(self, start: int, end: int):
+        """
+        Read video frames from start to end (inclusive).
+        Frame numbers are the same as in read_frames
+        Yields a tuple of [frameNumber, frameArray]
+        :param start: First frame number
+        :param end: Last frame number
+        :return: Generator
+        """
+        async for frame_number, frame in self.drain(self.iterate_range(start, end)):
+            yield frame_number, frame
+
+    def iterate_range(self, start: int, end: int) -> Generator[tuple[int, np.ndarray], None, None]:
+        keyframe = self.seek_index.keyframe_before(start - 1)
+        self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+
+        for _ in range(keyframe, start - 1):
+            if not self.vidcap.grab():
+                return
+
+        for frame_number in range(start, end + 1):
             success, frame = self.vidcap.read()
+            if not success:
+                break
+
+            yield frame_number, frame
+
+    async def detect_shots(self, cut_threshold: float = 0.4) -> list[tuple[int, int]]:
+        """
+        Split video into shots by comparing histograms of consecutive downscaled frames
+        :param cut_threshold: Bhattacharyya distance between frames [0..1], which is considered a scene cut
+        :return: List of [first frame number, last frame number] of every shot
+        """
+        shots = []
+        shot_start = 1
+        previous_hist = None
+        frame_number = 0
+
+        self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        async for frame_number, frame in self.read_frames():
+            check_cancelled(self.cancelled)
+            small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+            hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+            hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+            cv2.normalize(hist, hist)
+
+            if previous_hist is not None and cv2.compareHist(previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA) >= cut_threshold:
+                shots.append((shot_start, frame_number - 1))
+                shot_start = frame_number
+
+            previous_hist = hist
+
+        if frame_number >= shot_start:
+            shots.append((shot_start, frame_number))
+
+        self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return shots
+
+    async def get_shots(self, cut_threshold: float = 0.4) -> list[tuple[int, int]]:
+        """
+        Get video shots. Shot boundaries are cached, so video is only scanned once
+        :param cut_threshold: Scene cut threshold, see detect_shots
+        :return: List of [first frame number, last frame number] of every shot
+        """
+        kind = f"shots_{cut_threshold:g}"
+        cached = VideoCache.load_json(self.video_path, kind)
+        if cached is not None:
+            return [(start, end) for start, end in cached]
+
+        shots = await self.detect_shots(cut_threshold)
+        VideoCache.save_json(self.video_path, kind, shots)
+        self.logger.debug(f"Detected {len(shots)} shots in {self.video_path}")
+        return shots
+
+    @staticmethod
+    def shot_representatives(shot: tuple[int, int], count: int) -> list[int]:
+        """
+        Pick evenly spaced representative frame numbers of a shot
+        :param shot: [first frame number, last frame number]
+        :param count: Max representatives count
+        :return: Frame numbers
+        """
+        start, end = shot
+        count = max(1, min(count, end - start + 1))
+        if count == 1:
+            return [(start + end) // 2]
+
+        return sorted({start + round(i * (end - start) / (count - 1)) for i in range(count)})
 
     async def iterate_frames(self) -> AsyncGenerator[tuple[Any, Any], None]:
         """
@@ -189,16 +417,13 @@ class FrameCompiler:
         async for fi, f in coro:
             yield fi, f
 
-    def get_frame_at_time(self, time_str: str) -> np.ndarray:
+    @staticmethod
+    def parse_timecode(time_str: str) -> float:
         """
-        Get frame at specific timecode.
-
+        Parse timecode string to seconds
         :param time_str: Time string, e.g. "0:00:09.080000"
-        :return: Frame as ndarray
+        :return: Seconds
         """
-        if not self.vidcap.isOpened():
-            raise RuntimeError(f"Video {self.video_path} is not opened")
-
         try:
             if '.' in time_str:
                 dt = datetime.strptime(time_str, "%H:%M:%S.%f")
@@ -207,17 +432,95 @@ class FrameCompiler:
         except ValueError:
             raise ValueError(f"Invalid time format: {time_str}")
 
-        total_seconds = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000
+        return dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000
 
-        frame_index = int(round(total_seconds * self.fps))
+    def frame_index_at_time(self, time_str: str) -> int:
+        """
+        Convert timecode to frame index of this video.
+        Search timecodes are frame number (1-based, see read_frames) / fps
+        :param time_str: Time string, e.g. "0:00:09.080000"
+        :return: Frame index (0-based position), clamped to video length
+        """
+        frame_index = int(round(self.parse_timecode(time_str) * self.fps)) - 1
 
-        if frame_index >= self.total_frames:
-            frame_index = self.total_frames - 1
+        return min(max(frame_index, 0), self.total_frames - 1)
 
-        self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    async def fetch_frames(self, frame_indexes: Iterable[int]):
+        """
+        Async version of get_frames, frames are read in a worker thread
+        Yields a tuple of [frameIndex, frameArray]
+        :param frame_indexes: Frame indexes (0-based positions)
+        :return: Generator
+        """
+        async for frame_index, frame in self.drain(self.get_frames(list(frame_indexes))):
+            yield frame_index, frame
 
-        success, frame = self.vidcap.read()
-        if not success:
-            raise RuntimeError(f"Could not read frame at {time_str} (frame {frame_index})")
+    def get_frames(self, frame_indexes: Iterable[int]) -> Generator[tuple[int, np.ndarray], None, None]:
+        """
+        Read frames at random positions.
+        Seeks to the closest keyframe and grabs forward, targets are visited in order,
+        so frames of the same GOP are decoded in one pass
+        Yields a tuple of [frameIndex, frameArray]. Unreadable frames are skipped
+        :param frame_indexes: Frame indexes (0-based positions)
+        :return: Generator
+        """
+        if not self.vidcap.isOpened():
+            raise RuntimeError(f"Video {self.video_path} is not opened")
 
-        return frame
+        position = None  # Position of the next frame to be read
+        for frame_index in sorted(set(frame_indexes)):
+            keyframe = self.seek_index.keyframe_before(frame_index)
+
+            if position is None or frame_index < position or keyframe > position:
+                self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+                position = keyframe
+
+            while position < frame_index and self.vidcap.grab():
+                position += 1
+
+            success, frame = self.vidcap.read()
+            if not success or position != frame_index:
+                self.logger.warning(f"Could not read frame {frame_index} of {self.video_path}")
+                position = None
+                continue
+
+            position += 1
+            yield frame_index, frame
+
+    def get_frame_at_index(self, frame_index: int) -> np.ndarray:
+        """
+        Get frame by its index.
+
+        :param frame_index: Frame index (0-based position)
+        :return: Frame as ndarray
+        """
+        for _, frame in self.get_frames([frame_index]):
+            return frame
+
+        raise RuntimeError(f"Could not read frame {frame_index} of {self.video_path}")
+
+    def get_frame_at_ms(self, ms: float) -> np.ndarray:
+        """
+        Get frame displayed at timestamp
+
+        :param ms: Timestamp in milliseconds
+        :return: Frame as ndarray
+        """
+        return self.get_frame_at_index(self.seek_index.position_at_ms(ms))
+
+    def get_frame_at_time(self, time_str: str) -> np.ndarray:
+        """
+        Get frame at specific timecode.
+
+        :param time_str: Time string, e.g. "0:00:09.080000"
+        :return: Frame as ndarray
+        """
+        if not self.vidcap.isOpened():
+            raise RuntimeError(f"Video {self.video_path} is not opened")
+
+        frame_index = self.frame_index_at_time(time_str)
+
+        try:
+            return self.get_frame_at_index(frame_index)
+        except RuntimeError:
+            raise RuntimeError(f"Could not read frame at {time_str} (frame {frame_index})")
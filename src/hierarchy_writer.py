@@ -0,0 +1,192 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from logging import Logger
+from typing import Literal
+
+import cv2
+import numpy as np
+
+from settings import LOGGING
+from src.logger import init_logger
+from src.resource_budget import ResourceBudget
+
+
+class HierarchyWriter:
+    """
+    Writes result frames into the dist folder tree.
+    Every (video, frame index) is encoded only once into a frame store (dist/.frames),
+    all occurrences in the tree are links to the stored frame.
+    Existing files are kept, so an interrupted run can be resumed.
+    """
+
+    logger: Logger = init_logger(LOGGING['main'], "[bold blue]\\[HIERARCHY][/bold blue]")
+
+    STORE_FOLDER_NAME = ".frames"
+
+    def __init__(self,
+                 dist_path: str,
+                 image_format: Literal["jpg", "webp"] = "jpg",
+                 quality: int = 90,
+                 thumbnail_size: int | None = None,
+                 link_mode: Literal["hardlink", "symlink", "copy"] = "hardlink",
+                 workers: int | None = None):
+        if image_format not in ("jpg", "webp"):
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        self.dist_path = dist_path
+        self.image_format = image_format
+        self.quality = quality
+        self.thumbnail_size = thumbnail_size
+        self.link_mode = link_mode
+        self.workers = workers or os.cpu_count() or 4
+
+        self.store_path = os.path.join(self.dist_path, self.STORE_FOLDER_NAME)
+        os.makedirs(self.store_path, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.slots: threading.BoundedSemaphore | None = None  # Limit frames held in memory, sized by the first frame
+        self.futures: list[Future] = []
+
+        self.counters_lock = threading.Lock()
+        self.encoded = 0
+        self.linked = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return None
+
+    @property
+    def extension(self) -> str:
+        return "." + self.image_format
+
+    def stored_frame_path(self, video_path: str, frame_index: int) -> str:
+        """
+        Get frame store path for a video frame
+        :param video_path: Video path
+        :param frame_index: Frame index
+        :return: Path in frame store
+        """
+        video_key = hashlib.sha1(video_path.encode()).hexdigest()[:16]
+        # Frames encoded with other settings are never reused
+        encoding_key = f"q{self.quality}_{self.thumbnail_size or 'full'}"
+        return os.path.join(self.store_path, video_key, encoding_key, f"frame_{frame_index:06d}{self.extension}")
+
+    def submit(self, video_path: str, frame_index: int, frame: np.ndarray, targets: list[str]) -> None:
+        """
+        Queue frame to be encoded and linked into all target paths.
+        Blocks if too many frames are waiting for encoding.
+        :param video_path: Video path
+        :param frame_index: Frame index
+        :param frame: Frame as ndarray (BGR)
+        :param targets: Destination paths in dist tree
+        """
+        if self.slots is None:
+            self.slots = threading.BoundedSemaphore(ResourceBudget.frame_slots(frame.nbytes, self.workers * 2))
+
+        slots = self.slots
+        slots.acquire()
+        try:
+            future = self.executor.submit(self._write, self.stored_frame_path(video_path, frame_index), frame, targets)
+        except BaseException:
+            slots.release()
+            raise
+
+        future.add_done_callback(lambda _: slots.release())
+        self.futures.append(future)
+
+    def link_existing(self, video_path: str, frame_index: int, targets: list[str]) -> bool:
+        """
+        Link already stored frame to targets without decoding it again
+        :return: True if stored frame exists
+        """
+        stored_path = self.stored_frame_path(video_path, frame_index)
+        if not os.path.exists(stored_path):
+            return False
+
+        for target in targets:
+            self._link(stored_path, target)
+
+        return True
+
+    def close(self) -> None:
+        """
+        Wait for all queued frames and raise first occurred error
+        """
+        self.executor.shutdown(wait=True)
+
+        for future in self.futures:
+            future.result()
+
+        self.futures.clear()
+        self.logger.info(f"Encoded {self.encoded} frames, linked {self.linked} files, skipped {self.skipped} existing")
+
+    def _encode(self, frame: np.ndarray) -> bytes:
+        if self.thumbnail_size:
+            h, w = frame.shape[:2]
+            scale = self.thumbnail_size / max(h, w)
+            if scale < 1:
+                frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        if self.image_format == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        else:
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+
+        success, buffer = cv2.imencode(self.extension, frame, params)
+        if not success:
+            raise RuntimeError(f"Could not encode frame to {self.image_format}")
+
+        return buffer.tobytes()
+
+    def _write(self, stored_path: str, frame: np.ndarray, targets: list[str]) -> None:
+        if not os.path.exists(stored_path):
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+
+            # Write to temp file first, so interrupted writes are not picked up on resume
+            temp_path = stored_path + ".part"
+            with open(temp_path, "wb") as f:
+                f.write(self._encode(frame))
+            os.replace(temp_path, stored_path)
+            with self.counters_lock:
+                self.encoded += 1
+
+        for target in targets:
+            self._link(stored_path, target)
+
+    def _link(self, stored_path: str, target: str) -> None:
+        if os.path.lexists(target):
+            with self.counters_lock:
+                self.skipped += 1
+            return
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        if self.link_mode == "hardlink":
+            try:
+                os.link(stored_path, target)
+                self._count_link()
+                return
+            except OSError:
+                pass  # Different file system or not supported, try symlink
+
+        if self.link_mode in ("hardlink", "symlink"):
+            try:
+                os.symlink(os.path.relpath(stored_path, os.path.dirname(target)), target)
+                self._count_link()
+                return
+            except OSError:
+                pass
+
+        shutil.copyfile(stored_path, target)
+        self._count_link()
+
+    def _count_link(self) -> None:
+        with self.counters_lock:
+            self.linked += 1
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import threading
+from logging import Logger
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from settings import LOGGING, BASE_PATH, CACHE_FOLDER_NAME
+from src.batch_hash import BatchHasher
+from src.cancellation import check_cancelled
+from src.frame_compiler import FrameCompiler
+from src.logger import init_logger
+from src.video_cache import VideoCache
+from src.video_catalog import VideoCatalog
+
+
+class LibraryDeduplicator:
+    """
+    Finds duplicate videos in the comparing library (other release groups, re-encodes, copies).
+    Every video gets a temporal signature: DHashes of frames sampled at fixed timestamps.
+    Signatures are compared with tolerance to time offset, so copies with a shifted start are grouped too.
+    Only pairs sharing exact parts of many hashes are aligned, groups are cached until library changes
+    """
+
+    logger: Logger = init_logger(LOGGING['search_processor'], "[bold yellow]\\[LIBRARY-DEDUP][/bold yellow]")
+
+    BANDS = 4  # DHashes are split into 16 bit bands, matching hashes usually share at least one of them exactly
+    CANDIDATE_RATIO = 0.2  # Share of samples with a shared band, which makes a pair worth aligning
+    COMMON_BAND_VIDEOS = 50  # Bands found in more videos (black frames, logos) don't tell duplicates apart
+    CHUNK_VIDEOS = 100  # Videos matched against the band index at once
+
+    def __init__(self,
+                 catalog: VideoCatalog,
+                 interval: float = 0.5,
+                 signature_seconds: float = 300,
+                 max_offset: float = 10,
+                 max_distance: int = 10,
+                 min_match_ratio: float = 0.8,
+                 duration_tolerance: float = 15,
+                 cancelled: threading.Event | None = None):
+        """
+        :param catalog: Video catalog
+        :param interval: Seconds between sampled frames
+        :param signature_seconds: Length of video start to sample
+        :param max_offset: Max time shift between duplicates in seconds
+        :param max_distance: Max DHash distance (out of 64) of matching samples
+        :param min_match_ratio: Share of aligned samples, which must match
+        :param duration_tolerance: Max duration difference of duplicates in seconds
+        :param cancelled: Raise SearchCancelled when set
+        """
+        self.catalog = catalog
+        self.interval = interval
+        self.signature_seconds = signature_seconds
+        self.max_offset = max_offset
+        self.max_distance = max_distance
+        self.min_match_ratio = min_match_ratio
+        self.duration_tolerance = duration_tolerance
+        self.cancelled = cancelled
+
+    async def signature(self, video_path: str) -> np.ndarray:
+        """
+        Load signature from cache or build it
+        :param video_path: Video path
+        :return: uint64 DHashes of frames sampled every interval
+        """
+        kind = f"signature_v3_{self.interval:g}_{self.signature_seconds:g}"
+        cached = VideoCache.load_arrays(video_path, kind)
+        if cached is not None:
+            return cached["hashes"]
+
+        entry = self.catalog.get(video_path) or {}
+        async with FrameCompiler(video_path, entry, self.cancelled) as frame_compiler:
+            seek_index = await frame_compiler.load_seek_index()
+            duration_ms = entry.get("duration", 0) * 1000 or (seek_index.timestamps[-1] if len(seek_index.timestamps) else 0)
+
+            # Timestamps past the end would all clamp to the last frame and make unrelated short videos look alike
+            timestamps = np.arange(0, min(self.signature_seconds * 1000, duration_ms), self.interval * 1000)
+            positions = list(dict.fromkeys(seek_index.position_at_ms(ms) for ms in timestamps))
+
+            read_positions, frames = [], []
+            async for position, frame in frame_compiler.fetch_frames(positions):
+                check_cancelled(self.cancelled)
+                read_positions.append(position)
+                frames.append(cv2.resize(frame, (frame.shape[1] // 4 or 1, frame.shape[0] // 4 or 1), interpolation=cv2.INTER_AREA))
+
+            frame_hashes = dict(zip(read_positions, BatchHasher.dhash(frames)))
+            hashes = np.array([frame_hashes[p] for p in positions if p in frame_hashes], dtype=np.uint64)
+
+        VideoCache.save_arrays(video_path, kind, hashes=hashes)
+        return hashes
+
+    def best_offset(self, a: np.ndarray, b: np.ndarray) -> float | None:
+        """
+        Find time shift of b relative to a
+        :param a: Signature
+        :param b: Signature
+        :return: Offset in seconds (time in b = time in a + offset) or None if videos are not duplicates
+        """
+        max_shift = int(self.max_offset / self.interval)
+        min_overlap = max(1, int(min(len(a), len(b)) * 0.5))
+
+        best_ratio, best_shift = 0.0, None
+        for shift in range(-max_shift, max_shift + 1):
+            a_aligned = a[max(0, -shift):]
+            b_aligned = b[max(0, shift):]
+            overlap = min(len(a_aligned), len(b_aligned))
+            if overlap < min_overlap:
+                continue
+
+            distances = BatchHasher.hamming(a_aligned[:overlap], b_aligned[:overlap])
+            ratio = float((distances <= self.max_distance).mean())
+            if ratio > best_ratio:
+                best_ratio, best_shift = ratio, shift
+
+        if best_shift is None or best_ratio < self.min_match_ratio:
+            return None
+
+        return best_shift * self.interval
+
+    @classmethod
+    def band_keys(cls, hashes: np.ndarray, buckets: np.ndarray) -> np.ndarray:
+        """
+        Split DHashes into bands, tagged with band number and time bucket
+        :param hashes: uint64 DHashes
+        :param buckets: Time bucket of every hash (non-negative)
+        :return: Array of shape (n, BANDS), keys of different bands or buckets never collide
+        """
+        bits = 64 // cls.BANDS
+        shifts = np.arange(cls.BANDS, dtype=np.uint64) * np.uint64(bits)
+        bands = ((hashes[:, None] >> shifts) & np.uint64((1 << bits) - 1)).astype(np.int64)
+        tags = buckets.astype(np.int64)[:, None] * cls.BANDS + np.arange(cls.BANDS)
+        return (tags << bits) | bands
+
+    @staticmethod
+    def unique(values: np.ndarray, return_counts: bool = False):
+        """
+        Sorted unique values of int array. Plain sort is used, np.unique hashes large arrays and is much slower
+        :param values: Array
+        :param return_counts: Also return first index and count of every unique value in sorted array
+        :return: Unique values, or [unique values, first indexes, counts]
+        """
+        values = np.sort(values)
+        first = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]])) if len(values) else np.empty(0, int)
+        if not return_counts:
+            return values[first]
+
+        return values[first], first, np.diff(np.append(first, len(values)))
+
+    def candidate_pairs(self, signatures: dict[str, np.ndarray]) -> dict[str, set[str]]:
+        """
+        Find pairs of videos, which can be duplicates, without aligning every pair.
+        Pair is a candidate if enough samples of one video share a band with a sample of the other,
+        which is at most about max_offset away
+        :param signatures: Video path -> signature
+        :return: Video path -> candidate paths (symmetric)
+        """
+        paths = list(signatures)
+        candidates: dict[str, set[str]] = {path: set() for path in paths}
+        sample_counts = np.array([len(signatures[path]) for path in paths])
+        if not sample_counts.sum():
+            return candidates
+
+        # Every sample gets a global number, every band key is a row of (sample, key).
+        # Keys are bound to time buckets, so bands shared by chance far apart in time don't count
+        sample_videos = np.repeat(np.arange(len(paths)), sample_counts)
+        hashes = np.concatenate([signatures[path] for path in paths]).astype(np.uint64)
+        bucket_size = max(1, int(np.ceil(self.max_offset / self.interval)))
+        buckets = np.concatenate([np.arange(count) for count in sample_counts]) // bucket_size + 1
+        keys = self.band_keys(hashes, buckets).ravel()
+        samples = np.repeat(np.arange(len(sample_videos)), self.BANDS)
+
+        # Videos containing every key, also in neighbour buckets, as duplicates are shifted by up to max_offset.
+        # Keys found in too many videos are dropped
+        index = self.unique(np.concatenate([
+            self.band_keys(hashes, buckets + shift).ravel() * len(paths) + sample_videos[samples] for shift in (-1, 0, 1)
+        ]))
+        index_videos = index % len(paths)
+        index_keys, index_starts, index_counts = self.unique(index // len(paths), return_counts=True)
+        index_counts[index_counts > self.COMMON_BAND_VIDEOS] = 0
+
+        # Rows are expanded to videos sharing their key in chunks of videos, so memory stays bounded
+        video_ends = np.cumsum(sample_counts) * self.BANDS
+        for first in range(0, len(paths), self.CHUNK_VIDEOS):
+            start = video_ends[first - 1] if first else 0
+            end = video_ends[min(first + self.CHUNK_VIDEOS, len(paths)) - 1]
+
+            positions = np.searchsorted(index_keys, keys[start:end])
+            lengths = index_counts[positions]
+            rows = np.repeat(samples[start:end], lengths)
+            offsets = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            others = index_videos[np.repeat(index_starts[positions], lengths) + offsets]
+
+            # Count samples (not bands) of every video, which share anything with the other video
+            shared = others != sample_videos[rows]
+            sample_pairs = self.unique(rows[shared] * len(paths) + others[shared])
+            video_pairs, _, counts = self.unique(
+                sample_videos[sample_pairs // len(paths)] * len(paths) + sample_pairs % len(paths), return_counts=True
+            )
+
+            video, other = video_pairs // len(paths), video_pairs % len(paths)
+            passed = counts >= self.CANDIDATE_RATIO * sample_counts[video]
+            for a, b in zip(video[passed].tolist(), other[passed].tolist()):
+                candidates[paths[a]].add(paths[b])
+                candidates[paths[b]].add(paths[a])
+
+        return candidates
+
+    def groups_path(self, entries: dict[str, dict]) -> str:
+        """
+        Get cache file of duplicate groups. Key changes if any video is added, removed or changed, or settings change
+        :param entries: Video path -> catalog entry
+        """
+        data = json.dumps([
+            sorted((path, entry.get("size"), entry.get("mtime")) for path, entry in entries.items()),
+            [self.interval, self.signature_seconds, self.max_offset, self.max_distance,
+             self.min_match_ratio, self.duration_tolerance]
+        ])
+        key = hashlib.sha1(data.encode()).hexdigest()[:16]
+        return os.path.join(BASE_PATH, CACHE_FOLDER_NAME, "library_dedup", key + ".json")
+
+    async def find_duplicates(self, videos: list[str]) -> dict[str, list[tuple[str, float]]]:
+        """
+        Group duplicate videos. Groups are loaded from cache if library is the same as last time
+        :param videos: Video paths
+        :return: Primary video -> list of [alias path, offset in seconds]. Every video is either a primary or an alias
+        """
+        entries = {path: self.catalog.get(path) or {} for path in videos}
+
+        groups_path = self.groups_path(entries)
+        if os.path.exists(groups_path):
+            with open(groups_path, "r", encoding="utf-8") as f:
+                groups = {primary: [(alias, offset) for alias, offset in group] for primary, group in json.load(f).items()}
+        else:
+            groups = await self.group_videos(videos, entries)
+
+            os.makedirs(os.path.dirname(groups_path), exist_ok=True)
+            part_path = VideoCache.part_path(groups_path)
+            with open(part_path, "w", encoding="utf-8") as f:
+                json.dump(groups, f)
+            os.replace(part_path, groups_path)
+
+        aliases = [alias for group in groups.values() for alias, _ in group]
+        if aliases:
+            total_frames = sum(entries[p].get("frame_count", 0) for p in videos)
+            skipped_frames = sum(entries[p].get("frame_count", 0) for p in aliases)
+            self.logger.info(
+                f"Found {len(aliases)} duplicate videos, they will not be scanned "
+                f"({skipped_frames / max(total_frames, 1):.0%} of frames)"
+            )
+
+        return groups
+
+    async def group_videos(self, videos: list[str], entries: dict[str, dict]) -> dict[str, list[tuple[str, float]]]:
+        """
+        Fingerprint videos and group duplicates
+        :param videos: Video paths
+        :param entries: Video path -> catalog entry
+        :return: Primary video -> list of [alias path, offset in seconds]
+        """
+        # Highest resolution copy is scanned
+        ordered = sorted(videos, key=lambda p: entries[p].get("width", 0) * entries[p].get("height", 0), reverse=True)
+
+        signatures = {}
+        pbar = tqdm(total=len(ordered), desc="Fingerprinting videos", leave=False)
+        for path in ordered:
+            signatures[path] = await self.signature(path)
+            pbar.update()
+        pbar.close()
+
+        candidates = self.candidate_pairs(signatures)
+        self.logger.debug(
+            f"Aligning {sum(len(c) for c in candidates.values()) // 2} candidate pairs of {len(videos)} videos"
+        )
+
+        groups: dict[str, list[tuple[str, float]]] = {}
+        assigned = set()
+        for primary in ordered:
+            if primary in assigned:
+                continue
+
+            groups[primary] = []
+            for candidate in ordered:
+                if candidate not in candidates[primary] or candidate in assigned or candidate in groups:
+                    continue
+
+                duration_difference = abs(entries[primary].get("duration", 0) - entries[candidate].get("duration", 0))
+                if duration_difference > self.duration_tolerance:
+                    continue
+
+                offset = self.best_offset(signatures[primary], signatures[candidate])
+                if offset is not None:
+                    groups[primary].append((candidate, offset))
+                    assigned.add(candidate)
+
+        return groups
@@ -1,11 +1,17 @@
 import logging
 from typing import Literal
 
-import click
-from rich.logging import RichHandler
+_configured = False
 
 
-def init_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], prefix: str = ""):
+def _configure_root(level: str) -> None:
+    global _configured
+    if _configured:
+        return
+
+    import click
+    from rich.logging import RichHandler
+
     logging.basicConfig(
         level=level,
         format='',
@@ -15,7 +21,14 @@ def init_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
     )
 
     logging.getLogger("PIL.PngImagePlugin").setLevel(logging.WARNING)
+    _configured = True
+
 
+def _create_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], prefix: str = ""):
+    import click
+    from rich.logging import RichHandler
+
+    _configure_root(level)
 
     level_to_color = {
         "DEBUG": "cyan",
@@ -45,3 +58,24 @@ def init_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
     logger = logging.Logger(prefix, level=level)
     logger.addHandler(handler)
     return logger
+
+
+class LazyLogger:
+    """
+    Logger proxy. Logging and Rich handlers are configured on first use, not on import
+    """
+
+    def __init__(self, level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], prefix: str = ""):
+        self._level = level
+        self._prefix = prefix
+        self._logger: logging.Logger | None = None
+
+    def __getattr__(self, name: str):
+        if self._logger is None:
+            self._logger = _create_logger(self._level, self._prefix)
+
+        return getattr(self._logger, name)
+
+
+def init_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], prefix: str = ""):
+    return LazyLogger(level, prefix)
@@ -1,22 +1,35 @@
 from logging import Logger
 
-import cv2
-import imagehash
 import numpy as np
-from PIL import Image
-from skimage.metrics import structural_similarity as ssim
 
-from settings import LOGGING
+from settings import LOGGING, PROTOCOLS
 from src.logger import init_logger
+from src.protocols import get_protocol, MatchProtocol
 
 
 class FrameMatchProcessor:
     logger: Logger = init_logger(LOGGING['match_processor'], "[bold magenta]\[MATCH-PROCESSOR][/bold magenta]")
 
-    def __init__(self, original: np.array, comparing: np.array):
+    def __init__(self, original: np.array, comparing: np.array, protocols: dict[str, MatchProtocol] | None = None):
+        """
+        :param original: Original image
+        :param comparing: Frame image
+        :param protocols: Match backends, prepared for this original. Created on demand if missing
+        """
         self.original: np.array = original
         self.comparing: np.array = comparing
+        self.protocols = protocols if protocols is not None else {}
 
+    def protocol(self, name: str) -> MatchProtocol:
+        """
+        Get match backend for instance original
+        :param name: Protocol name
+        :return: MatchProtocol
+        """
+        if name not in self.protocols:
+            self.protocols[name] = get_protocol(name)(self.original, PROTOCOLS.get(name, {}))
+
+        return self.protocols[name]
 
     def compare_ssim(self, similarity: float = 0.95, return_score: bool = False) -> bool | float:
         """
@@ -25,14 +38,7 @@ class FrameMatchProcessor:
         :param similarity: How similar frames should be to return True
         :return: True if matching, False if not
         """
-        # Resize to same shape
-        h, w = self.original.shape[:2]
-        comparing_resized = cv2.resize(self.comparing, (w, h))
-
-        gray_original = cv2.cvtColor(self.original, cv2.COLOR_BGR2GRAY)
-        gray_comparing = cv2.cvtColor(comparing_resized, cv2.COLOR_BGR2GRAY)
-
-        score, _ = ssim(gray_original, gray_comparing, full=True)
+        score = self.protocol("ssim").raw_score(self.comparing)
 
         self.logger.debug(f"SSIM score: {score:.2f}")
 
@@ -48,22 +54,17 @@ class FrameMatchProcessor:
         :param similarity: How similar frames should be to return True
         :return: True if similar
         """
-        img1 = Image.fromarray(cv2.cvtColor(self.original, cv2.COLOR_BGR2RGB))
-        img2 = Image.fromarray(cv2.cvtColor(self.comparing, cv2.COLOR_BGR2RGB))
-
-        hash1 = imagehash.phash(img1)
-        hash2 = imagehash.phash(img2)
+        distance = self.protocol("phash").raw_score(self.comparing)
 
         max_distance = 64
         threshold_distance = max_distance * (1 - similarity)
 
-        self.logger.debug(f"PHash score: {(hash1 - hash2)} out of {threshold_distance} ({round((hash1 - hash2) / threshold_distance, 2):.2f}%)")
-
+        self.logger.debug(f"PHash score: {distance} out of {threshold_distance} ({round(distance / threshold_distance, 2):.2f}%)")
 
         if return_score:
-            return hash1 - hash2
+            return distance
 
-        return (hash1 - hash2) <= threshold_distance
+        return distance <= threshold_distance
 
     def compare_template(self, threshold: float = 0.9, return_score: bool = False) -> bool | float:
         """
@@ -72,11 +73,7 @@ class FrameMatchProcessor:
         :param threshold: Similarity threshold [0..1]
         :return: True if match found
         """
-        frame_gray = cv2.cvtColor(self.comparing, cv2.COLOR_BGR2GRAY)
-        template_gray = cv2.cvtColor(self.original, cv2.COLOR_BGR2GRAY)
-
-        res = cv2.matchTemplate(frame_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+        max_val = self.protocol("template").raw_score(self.comparing)
 
         self.logger.debug(f"Template match score: {max_val:.2f}")
 
@@ -84,3 +81,33 @@ class FrameMatchProcessor:
             return max_val
 
         return max_val >= threshold
+
+    def compare_features(self, similarity: float = 0.1, return_score: bool = False) -> bool | float:
+        """
+        Match original keypoints (ORB/AKAZE) in frame and verify them with RANSAC homography.
+        Finds scaled and cropped originals
+        :param return_score: Return score
+        :param similarity: Share of keypoints in matched region, which must be inliers [0..1]
+        :return: True if match found
+        """
+        score = self.protocol("features").raw_score(self.comparing)
+
+        self.logger.debug(f"Features score: {score:.2f}")
+
+        if return_score:
+            return score
+
+        return score >= similarity
+
+    def similarity_score(self, protocol: str) -> float:
+        """
+        Score instance frames using protocol, normalized so the higher score is the more similar [0..1]
+        Score can be compared with protocol similarity threshold from settings
+        :param protocol: Protocol name from settings
+        :return: Score
+        """
+        score = self.protocol(protocol).score(self.comparing)
+
+        self.logger.debug(f"{protocol.upper()} similarity score: {score:.2f}")
+
+        return score
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from settings import LOGGING
+from src.batch_hash import BatchHasher
+from src.logger import init_logger
+from src.resource_budget import ResourceBudget
+
+
+class OriginalClusterer:
+    """
+    Groups near-duplicate originals (crops, re-encodes, different sizes of the same screenshot),
+    so only one representative of each group has to be searched.
+    """
+
+    logger: Logger = init_logger(LOGGING['search_processor'], "[bold yellow]\\[CLUSTERER][/bold yellow]")
+
+    def __init__(self, originals: list[str], max_distance: int = 6):
+        """
+        :param originals: Original file paths
+        :param max_distance: Max PHash distance (out of 64) between originals of the same cluster
+        """
+        self.originals = originals
+        self.max_distance = max_distance
+
+    @staticmethod
+    def load_original(path: str) -> np.ndarray:
+        with Image.open(path) as image:
+            return cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+    def cluster(self) -> list[list[str]]:
+        """
+        Cluster originals by PHash distance
+        :return: List of clusters. First path of every cluster is its representative (largest image)
+        """
+        hashes, pixels = [], []
+        # Originals are loaded in groups within RAM budget and dropped once hashed
+        for group in ResourceBudget.group_originals(self.originals, ["phash"]):
+            with ThreadPoolExecutor() as executor:
+                images = list(executor.map(self.load_original, group))
+
+            hashes.append(BatchHasher.phash(images))
+            pixels.extend(image.shape[0] * image.shape[1] for image in images)
+
+        hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+        distances = BatchHasher.hamming(hashes[:, None], hashes[None, :])
+
+        parents = list(range(len(self.originals)))
+
+        def find(i: int) -> int:
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for i, j in zip(*np.nonzero(distances <= self.max_distance)):
+            if i < j:
+                parents[find(j)] = find(i)
+
+        groups: dict[int, list[int]] = {}
+        for i in range(len(self.originals)):
+            groups.setdefault(find(i), []).append(i)
+
+        clusters = []
+        for indexes in groups.values():
+            indexes.sort(key=lambda i: pixels[i], reverse=True)
+            clusters.append([self.originals[i] for i in indexes])
+
+        self.logger.info(f"Clustered {len(self.originals)} originals into {len(clusters)} groups")
+        return clusters
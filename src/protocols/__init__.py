@@ -0,0 +1,45 @@
+import importlib
+
+from src.protocols.base import MatchProtocol
+
+# Protocol name -> "module:class". Backends are imported only when used
+PROTOCOL_BACKENDS: dict[str, str] = {
+    "ssim": "src.protocols.ssim:SSIMProtocol",
+    "phash": "src.protocols.phash:PHashProtocol",
+    "template": "src.protocols.template:TemplateProtocol",
+    "features": "src.protocols.features:FeaturesProtocol",
+}
+
+_loaded: dict[str, type[MatchProtocol]] = {}
+
+
+def register_protocol(name: str, backend: str | type[MatchProtocol]) -> None:
+    """
+    Register match backend
+    :param name: Protocol name, as used in PROTOCOLS settings
+    :param backend: Backend class or "module:class" path to import it lazily
+    """
+    _loaded.pop(name, None)
+
+    if isinstance(backend, str):
+        PROTOCOL_BACKENDS[name] = backend
+    else:
+        PROTOCOL_BACKENDS[name] = f"{backend.__module__}:{backend.__qualname__}"
+        _loaded[name] = backend
+
+
+def get_protocol(name: str) -> type[MatchProtocol]:
+    """
+    Get match backend class, importing it on first use
+    :param name: Protocol name
+    :return: MatchProtocol subclass
+    """
+    if name in _loaded:
+        return _loaded[name]
+
+    if name not in PROTOCOL_BACKENDS:
+        raise ValueError(f"Unknown protocol: {name}")
+
+    module_name, class_name = PROTOCOL_BACKENDS[name].split(":")
+    _loaded[name] = getattr(importlib.import_module(module_name), class_name)
+    return _loaded[name]
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class MatchProtocol:
+    """
+    Match backend. Prepares original once and scores frames against it.
+    Subclasses implement raw_score and, if raw score is not a similarity [0..1], score
+    """
+
+    scale_invariant = False  # Original can be downscaled without breaking the match
+
+    def __init__(self, original: np.ndarray, options: dict, threshold: float | None = None):
+        """
+        :param original: Original image (BGR)
+        :param options: Protocol settings from PROTOCOLS
+        :param threshold: Score, which is considered a hit. Defaults to protocol similarity
+        """
+        self.original = original
+        self.options = options
+        self.threshold = threshold if threshold is not None else options.get("similarity", 0)
+
+    def reset(self) -> None:
+        """
+        Drop state, collected on previous frames. Called when the next video starts
+        """
+
+    def raw_score(self, frame: np.ndarray) -> float:
+        """
+        Protocol specific score of frame
+        :param frame: Frame (BGR)
+        """
+        raise NotImplementedError
+
+    def score(self, frame: np.ndarray) -> float:
+        """
+        Score of frame normalized so the higher score is the more similar [0..1].
+        Comparable with protocol similarity threshold
+        :param frame: Frame (BGR)
+        """
+        return self.raw_score(frame)
+
+    def score_frames(self, frames: list[np.ndarray]) -> list[float]:
+        """
+        Score consecutive frames, see score.
+        Backends, which can process several frames at once, override it
+        :param frames: Frames (BGR) in video order
+        """
+        return [self.score(frame) for frame in frames]
@@ -0,0 +1,20 @@
+import numpy as np
+
+from src.feature_index import FeatureIndex
+from src.protocols.base import MatchProtocol
+
+
+class FeaturesProtocol(MatchProtocol):
+    """
+    Matches original keypoints (ORB/AKAZE) in frame and verifies them with RANSAC homography.
+    Raw score is a share of keypoints in the matched frame region, which are inliers
+    """
+
+    scale_invariant = True
+
+    def __init__(self, original: np.ndarray, options: dict, threshold: float | None = None):
+        super().__init__(original, options, threshold)
+        self.index = FeatureIndex(original, options.get("detector", "orb"), options.get("max_features", 1000))
+
+    def raw_score(self, frame: np.ndarray) -> float:
+        return self.index.score(frame)
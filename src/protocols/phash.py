@@ -0,0 +1,29 @@
+import numpy as np
+
+from src.batch_hash import BatchHasher
+from src.protocols.base import MatchProtocol
+
+
+class PHashProtocol(MatchProtocol):
+    """
+    Compares full frame with original using PHash.
+    Raw score is hash distance (out of 64)
+    """
+
+    scale_invariant = True
+
+    MAX_DISTANCE = 64
+
+    def __init__(self, original: np.ndarray, options: dict, threshold: float | None = None):
+        super().__init__(original, options, threshold)
+        self.original_hash = BatchHasher.phash([original])[0]
+
+    def raw_score(self, frame: np.ndarray) -> float:
+        return int(BatchHasher.hamming(self.original_hash, BatchHasher.phash([frame])[0]))
+
+    def score(self, frame: np.ndarray) -> float:
+        return 1 - self.raw_score(frame) / self.MAX_DISTANCE
+
+    def score_frames(self, frames: list[np.ndarray]) -> list[float]:
+        distances = BatchHasher.hamming(self.original_hash, BatchHasher.phash(frames))
+        return [1 - int(distance) / self.MAX_DISTANCE for distance in distances]
@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity as ssim
+
+from src.protocols.base import MatchProtocol
+
+
+class SSIMProtocol(MatchProtocol):
+    """
+    Compares full frame with original using SSIM
+    """
+
+    scale_invariant = True
+
+    def __init__(self, original: np.ndarray, options: dict, threshold: float | None = None):
+        super().__init__(original, options, threshold)
+        self.gray_original = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
+
+    def raw_score(self, frame: np.ndarray) -> float:
+        # Resize to same shape
+        h, w = self.gray_original.shape[:2]
+        comparing_resized = cv2.resize(frame, (w, h))
+        gray_comparing = cv2.cvtColor(comparing_resized, cv2.COLOR_BGR2GRAY)
+
+        score, _ = ssim(self.gray_original, gray_comparing, full=True)
+        return score
@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+from settings import QUERY
+from src.protocols.base import MatchProtocol
+from src.template_tracker import TemplateTracker
+
+
+class TemplateProtocol(MatchProtocol):
+    """
+    Searches original as a part of the frame using template matching.
+    If tracking is enabled, frames after a match are searched around the match location
+    """
+
+    def __init__(self, original: np.ndarray, options: dict, threshold: float | None = None):
+        super().__init__(original, options, threshold)
+        self.template_gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
+        self.tracker: TemplateTracker | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        if self.options.get("tracking"):
+            # Scores, which stop the search in top_k mode, are confirmed by a full-frame search
+            confirm_score = QUERY["certain_score"] if QUERY["mode"] == "top_k" else None
+            self.tracker = TemplateTracker(self.threshold, self.options.get("tracking_padding", 32), confirm_score)
+
+    def raw_score(self, frame: np.ndarray) -> float:
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.tracker is not None:
+            return self.tracker.match(frame_gray, self.template_gray)
+
+        res = cv2.matchTemplate(frame_gray, self.template_gray, cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+        return max_val
@@ -0,0 +1,87 @@
+import heapq
+import itertools
+from collections import Counter
+from datetime import timedelta
+from typing import Literal
+
+Hit = tuple[str, str, str, timedelta]  # (original_path, compare_path, protocol_name, timecode)
+
+
+class QueryState:
+    """
+    Collects hits of one original according to query mode:
+    all - every hit above threshold
+    top_k - k best hits, kept in a bounded heap
+    first_hit - only the first hit above threshold
+    Original is satisfied when no more scanning is needed for it
+    """
+
+    def __init__(self,
+                 mode: Literal["all", "top_k", "first_hit"] = "all",
+                 k: int = 5,
+                 certain_score: float | None = None,
+                 per_video_cap: int | None = None):
+        """
+        :param mode: Query mode
+        :param k: Hits count to keep in top_k mode
+        :param certain_score: Stop scanning after hit with this score (top_k mode)
+        :param per_video_cap: Max hits per video
+        """
+        if mode not in ("all", "top_k", "first_hit"):
+            raise ValueError(f"Unsupported query mode: {mode}")
+
+        self.mode = mode
+        self.k = k
+        self.certain_score = certain_score
+        self.per_video_cap = per_video_cap
+
+        self.heap: list[tuple[float, int, Hit]] = []
+        self.counter = itertools.count()  # Tie breaker, hits are not comparable
+        self.video_hits: Counter[str] = Counter()
+        self.satisfied = False
+
+    def is_capped(self, compare_path: str) -> bool:
+        """
+        Check if no more hits are needed from this video
+        """
+        if self.satisfied:
+            return True
+
+        return self.per_video_cap is not None and self.video_hits[compare_path] >= self.per_video_cap
+
+    def offer(self, hit: Hit, score: float) -> list[Hit]:
+        """
+        Offer a hit above threshold
+        :param hit: Hit tuple
+        :param score: Hit score
+        :return: Hits, which can be reported right away
+        """
+        if self.is_capped(hit[1]):
+            return []
+
+        self.video_hits[hit[1]] += 1
+
+        if self.mode == "all":
+            return [hit]
+
+        if self.mode == "first_hit":
+            self.satisfied = True
+            return [hit]
+
+        entry = (score, next(self.counter), hit)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        else:
+            heapq.heappushpop(self.heap, entry)
+
+        if self.certain_score is not None and score >= self.certain_score:
+            self.satisfied = True
+
+        return []
+
+    def finish(self) -> list[Hit]:
+        """
+        Get hits, which are reported only after the scan (top_k mode)
+        :return: Hits, best first
+        """
+        return [hit for _, _, hit in sorted(self.heap, reverse=True)]
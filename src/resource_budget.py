@@ -0,0 +1,236 @@
+import os
+import shutil
+import threading
+from logging import Logger
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from settings import LOGGING, RESOURCE_BUDGET
+from src.logger import init_logger
+
+
+class ResourceBudget:
+    """
+    Global limits of RAM, temp disk and frame queue bytes from RESOURCE_BUDGET settings.
+    Components ask it how much they may hold: frame queues shrink their depth, buffering is refused,
+    originals are downscaled or loaded in smaller groups. With budget disabled every method keeps default behavior
+    """
+
+    logger: Logger = init_logger(LOGGING['main'], "[bold magenta]\\[BUDGET][/bold magenta]")
+
+    MB = 1024 * 1024
+    PREPARED_ORIGINAL_FACTOR = 2  # Original image + data prepared by protocols (gray copies, keypoints)
+
+    # Temp folder -> bytes used. Folder is walked once, then writes and removals of this process are tracked
+    temp_bytes: dict[str, int] = {}
+    temp_lock = threading.Lock()
+
+    @staticmethod
+    def enabled() -> bool:
+        return RESOURCE_BUDGET["use"]
+
+    @classmethod
+    def ram_bytes(cls) -> int:
+        return int(RESOURCE_BUDGET["ram_mb"] * cls.MB)
+
+    @classmethod
+    def temp_disk_bytes(cls) -> int:
+        return int(RESOURCE_BUDGET["temp_disk_mb"] * cls.MB)
+
+    @classmethod
+    def frame_queue_bytes(cls) -> int:
+        return int(RESOURCE_BUDGET["frame_queue_mb"] * cls.MB)
+
+    @classmethod
+    def frame_slots(cls, frame_bytes: int, default: int) -> int:
+        """
+        Get how many decoded frames a queue may hold
+        :param frame_bytes: Size of one frame
+        :param default: Queue depth without budget
+        :return: Queue depth, at least 1
+        """
+        if not cls.enabled():
+            return default
+
+        return max(1, min(default, cls.frame_queue_bytes() // max(frame_bytes, 1)))
+
+    @staticmethod
+    def folder_size(path: str) -> int:
+        """
+        Total size of files in folder
+        """
+        total = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass  # Removed while walking
+        return total
+
+    @classmethod
+    def temp_usage(cls, temp_path: str) -> int:
+        """
+        Get bytes used in temp folder
+        :param temp_path: Temp folder
+        """
+        with cls.temp_lock:
+            if temp_path not in cls.temp_bytes:
+                cls.temp_bytes[temp_path] = cls.folder_size(temp_path)
+            return cls.temp_bytes[temp_path]
+
+    @classmethod
+    def track_temp(cls, temp_path: str, delta: int) -> None:
+        """
+        Account bytes written to (or removed from) temp folder
+        :param temp_path: Temp folder
+        :param delta: Bytes written, negative if removed
+        """
+        with cls.temp_lock:
+            if temp_path in cls.temp_bytes:
+                cls.temp_bytes[temp_path] = max(0, cls.temp_bytes[temp_path] + delta)
+
+    @classmethod
+    def remove_temp(cls, temp_path: str, path: str) -> None:
+        """
+        Remove folder inside temp folder, keeping usage up to date. Blocking
+        :param temp_path: Temp folder
+        :param path: Folder to remove
+        """
+        size = cls.folder_size(path) if cls.enabled() and temp_path in cls.temp_bytes else 0
+        shutil.rmtree(path, True)
+        cls.track_temp(temp_path, -size)
+
+    @classmethod
+    def temp_available(cls, temp_path: str) -> int | None:
+        """
+        Get temp disk bytes, which can still be written
+        :param temp_path: Temp folder
+        :return: Bytes, or None if not limited
+        """
+        if not cls.enabled():
+            return None
+
+        free_disk = shutil.disk_usage(temp_path).free if os.path.exists(temp_path) else None
+        available = cls.temp_disk_bytes() - cls.temp_usage(temp_path)
+        return max(0, min(available, free_disk) if free_disk is not None else available)
+
+    @classmethod
+    def original_scale(cls, width: int, height: int, protocols: list[str]) -> float:
+        """
+        Get downscale factor of original.
+        Originals are downscaled only if every protocol is scale invariant, template search needs original scale
+        :param width: Original width
+        :param height: Original height
+        :param protocols: Enabled protocol names
+        :return: Scale factor (1 - keep as is)
+        """
+        if not cls.enabled() or not RESOURCE_BUDGET["original_max_side"]:
+            return 1.0
+
+        from src.protocols import get_protocol
+
+        if not all(get_protocol(name).scale_invariant for name in protocols):
+            return 1.0
+
+        return min(1.0, RESOURCE_BUDGET["original_max_side"] / max(width, height, 1))
+
+    @classmethod
+    def fit_original(cls, image: np.ndarray, protocols: list[str]) -> np.ndarray:
+        """
+        Downscale original if budget allows protocols to use a smaller copy
+        :param image: Original image
+        :param protocols: Enabled protocol names
+        :return: Original or downscaled copy
+        """
+        scale = cls.original_scale(image.shape[1], image.shape[0], protocols)
+        if scale >= 1.0:
+            return image
+
+        size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    @classmethod
+    def group_originals(cls, paths: list[str], protocols: list[str], share: float = 0.5) -> list[list[str]]:
+        """
+        Split originals into groups, which can be loaded and prepared at once within RAM budget
+        :param paths: Original paths
+        :param protocols: Enabled protocol names
+        :param share: Share of RAM budget for one group
+        :return: Groups of paths. Single group if budget is disabled
+        """
+        if not cls.enabled():
+            return [paths] if paths else []
+
+        limit = cls.ram_bytes() * share
+        groups, group, group_bytes = [], [], 0
+        for path in paths:
+            # Only image header is read here
+            with Image.open(path) as image:
+                width, height = image.size
+
+            scale = cls.original_scale(width, height, protocols)
+            size = width * height * 3 * scale * scale * cls.PREPARED_ORIGINAL_FACTOR
+
+            if group and group_bytes + size > limit:
+                groups.append(group)
+                group, group_bytes = [], 0
+
+            group.append(path)
+            group_bytes += size
+
+        if group:
+            groups.append(group)
+
+        return groups
+
+    @staticmethod
+    def memory_usage() -> int | None:
+        """
+        Resident memory of this process
+        :return: Bytes, or None if it can't be read on this system
+        """
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        try:
+            import resource
+        except ImportError:
+            return None
+
+        # Peak instead of current usage, kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+    @classmethod
+    def report(cls, temp_path: str | None = None, level: str = "info") -> None:
+        """
+        Log current resource usage against the budget
+        :param temp_path: Temp folder
+        :param level: Log level if usage is within budget
+        """
+        if not cls.enabled():
+            return
+
+        memory = cls.memory_usage()
+        over_budget = memory is not None and memory > cls.ram_bytes()
+        parts = [
+            f"RAM {memory / cls.MB:.0f} MB / {RESOURCE_BUDGET['ram_mb']} MB" if memory is not None
+            else f"RAM n/a / {RESOURCE_BUDGET['ram_mb']} MB"
+        ]
+
+        if temp_path is not None and os.path.exists(temp_path):
+            temp = cls.temp_usage(temp_path)
+            over_budget = over_budget or temp > cls.temp_disk_bytes()
+            parts.append(f"temp {temp / cls.MB:.0f} MB / {RESOURCE_BUDGET['temp_disk_mb']} MB")
+
+        message = "Resource usage: " + ", ".join(parts)
+        if over_budget:
+            cls.logger.warning(message + " [bold red](over budget)")
+        else:
+            getattr(cls.logger, level)(message)
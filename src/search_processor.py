@@ -1,56 +1,420 @@
 import asyncio
+import os
+import threading
 from datetime import timedelta
 from logging import Logger
 from typing import Generator, AsyncGenerator
 
+import cv2
 import numpy as np
 from PIL import Image
 from tqdm import tqdm
 
-from settings import LOGGING, PROTOCOLS
+from settings import BASE_PATH, LOGGING, PROTOCOLS, CLUSTER_ORIGINALS, PREFILTER, SHOT_SEARCH, QUERY, LIBRARY_DEDUP, \
+    CALIBRATION
+from src.cancellation import SearchCancelled
 from src.frame_compiler import FrameCompiler
 from src.logger import init_logger
 from src.match_processor import FrameMatchProcessor
+from src.protocols import get_protocol, MatchProtocol
+from src.query_state import QueryState, Hit
+from src.resource_budget import ResourceBudget
+from src.video_catalog import VideoCatalog
 
 
 class SearchProcessor:
     logger: Logger = init_logger(LOGGING['search_processor'], "[bold yellow]\[SEARCH-PROCESSOR][/bold yellow]")
 
 
-    def __init__(self, originals: list[str], comparing: list[str]):
+    def __init__(self, originals: list[str], comparing: list[str], catalog: VideoCatalog | None = None):
         self.originals = originals
         self.comparing = comparing
+        self.catalog = catalog or VideoCatalog()
+
+        self.summaries: dict = {}  # Video path -> VideoSummary
+        self.aliases: dict[str, list[tuple[str, float]]] = {}  # Scanned video -> [duplicate video, offset in seconds]
+        self.pruned_videos = 0
+
+        self.thresholds: dict[str, dict[str, float]] = {}  # Original path -> protocol -> calibrated threshold
+
+        self.prepared: dict[int, dict[str, MatchProtocol]] = {}  # id(original) -> match backends, reset for every cluster
+        self.search_thresholds: dict[int, dict[str, float]] = {}  # id(original) -> protocol -> threshold in current cluster
+
+        self.cancelled = threading.Event()  # Set from any thread to stop the search after the current frame or step
+
+    def cancel(self) -> None:
+        """
+        Stop running search. Thread safe
+        """
+        self.cancelled.set()
+
+    @staticmethod
+    def load_original(path: str) -> np.ndarray:
+        """
+        Load original image in the same color layout as video frames
+        :param path: Original path
+        :return: BGR image
+        """
+        with Image.open(path) as image:
+            return cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+    def prepare_original(self, path: str) -> np.ndarray:
+        """
+        Load original for search, downscaled if resource budget allows
+        :param path: Original path
+        :return: BGR image
+        """
+        return ResourceBudget.fit_original(self.load_original(path), [name for name, _ in self.enabled_protocols()])
+
+    @staticmethod
+    def enabled_protocols() -> list[tuple[str, float]]:
+        """
+        Get protocols enabled in settings
+        :return: List of [protocol name, similarity]
+        """
+        return [(name, protocol["similarity"]) for name, protocol in PROTOCOLS.items() if protocol["use"]]
+
+    def similarity(self, original_path: str, protocol: str) -> float:
+        """
+        Get threshold of original, calibrated if calibration is enabled
+        :param original_path: Original path
+        :param protocol: Protocol name from settings
+        :return: Score, which is considered a hit
+        """
+        return self.thresholds.get(original_path, {}).get(protocol, PROTOCOLS[protocol]["similarity"])
+
+    def protocols(self, original: np.ndarray) -> dict[str, MatchProtocol]:
+        """
+        Get match backends of the original, prepared once per cluster
+        :param original: Original image
+        :return: Protocol name -> MatchProtocol
+        """
+        protocols = self.prepared.get(id(original))
+        if protocols is None:
+            thresholds = self.search_thresholds.get(id(original), {})
+            protocols = {
+                name: get_protocol(name)(original, PROTOCOLS[name], thresholds.get(name, similarity))
+                for name, similarity in self.enabled_protocols()
+            }
+            self.prepared[id(original)] = protocols
+
+        return protocols
+
+    def match_processor(self, original: np.ndarray, frame: np.ndarray) -> FrameMatchProcessor:
+        """
+        Create match processor, reusing prepared data of the original
+        :param original: Original image
+        :param frame: Frame image
+        :return: FrameMatchProcessor
+        """
+        return FrameMatchProcessor(original, frame, self.protocols(original))
+
+    def score(self, original: np.ndarray, frame: np.ndarray, protocol: str) -> float:
+        """
+        Score original and frame using protocol
+        :param original: Original image
+        :param frame: Frame image
+        :param protocol: Protocol name from settings
+        :return: Score, comparable with protocol similarity threshold
+        """
+        return self.match_processor(original, frame).similarity_score(protocol)
+
+    def score_batch(self, original: np.ndarray, batch: list[tuple[int, np.ndarray]]) -> dict[str, dict[int, float]]:
+        """
+        Score consecutive frames with every enabled protocol, so protocols can process frames together.
+        Frames skipped by protocol frame_step are not scored
+        :param original: Original image
+        :param batch: List of [frameNumber, frameArray]
+        :return: Protocol name -> frame number -> score
+        """
+        scores = {}
+        for protocol, _ in self.enabled_protocols():
+            step = PROTOCOLS[protocol].get("frame_step", 1)
+            frames = [(frame_index, frame) for frame_index, frame in batch if not (frame_index - 1) % step]
+            protocol_scores = self.protocols(original)[protocol].score_frames([frame for _, frame in frames])
+            scores[protocol] = dict(zip([frame_index for frame_index, _ in frames], protocol_scores))
+        return scores
+
+    @staticmethod
+    def create_query() -> QueryState:
+        return QueryState(QUERY["mode"], QUERY["k"], QUERY["certain_score"], QUERY["per_video_cap"])
+
+    def get_clusters(self) -> list[list[str]]:
+        """
+        Group near-duplicate originals if enabled in settings
+        :return: List of clusters, first path is cluster representative
+        """
+        if not CLUSTER_ORIGINALS["use"]:
+            return [[original] for original in self.originals]
+
+        from src.original_clusterer import OriginalClusterer
+
+        return OriginalClusterer(self.originals, CLUSTER_ORIGINALS["max_distance"]).cluster()
+
+    async def deduplicate_library(self) -> None:
+        """
+        Find duplicate videos, so only one copy of each is scanned
+        """
+        from src.library_dedup import LibraryDeduplicator
+
+        deduplicator = LibraryDeduplicator(
+            self.catalog,
+            LIBRARY_DEDUP["interval"],
+            LIBRARY_DEDUP["signature_seconds"],
+            LIBRARY_DEDUP["max_offset"],
+            LIBRARY_DEDUP["max_distance"],
+            LIBRARY_DEDUP["min_match_ratio"],
+            LIBRARY_DEDUP["duration_tolerance"],
+            self.cancelled
+        )
+        groups = await deduplicator.find_duplicates(self.comparing)
+
+        self.aliases = {primary: aliases for primary, aliases in groups.items() if aliases}
+        self.comparing = [path for path in self.comparing if path in groups]
+
+    def expand_aliases(self, hit: Hit) -> list[Hit]:
+        """
+        Report hit for the scanned video and all of its duplicates, with mapped timecodes
+        :param hit: Hit in scanned video
+        :return: Hits
+        """
+        original_path, compare_path, protocol, timecode = hit
+        hits = [hit]
+
+        for alias_path, offset in self.aliases.get(compare_path, []):
+            alias_timecode = timecode + timedelta(seconds=offset)
+            entry = self.catalog.get(alias_path)
+            if alias_timecode < timedelta(0) or (entry and alias_timecode.total_seconds() > entry.get("duration", 0)):
+                continue
+
+            hits.append((original_path, alias_path, protocol, alias_timecode))
+
+        return hits
+
+    async def calibrate(self) -> None:
+        """
+        Derive per-original thresholds from scores of random library frames
+        """
+        from src.threshold_calibrator import ThresholdCalibrator
+
+        calibrator = ThresholdCalibrator(
+            self.catalog,
+            self.comparing,
+            CALIBRATION["sample_frames"],
+            CALIBRATION["z_score"],
+            CALIBRATION["false_positive_rate"],
+            CALIBRATION["raise_only"],
+            self.cancelled
+        )
+        protocols = self.enabled_protocols()
+        for group in ResourceBudget.group_originals(self.originals, [name for name, _ in protocols]):
+            originals = {path: self.prepare_original(path) for path in group}
+            self.thresholds.update(await calibrator.calibrate(originals, protocols))
+
+    async def build_summaries(self) -> None:
+        """
+        Build (or load cached) summaries of all comparing videos for prefiltering
+        """
+        from src.video_summary import VideoSummary
+
+        pbar = tqdm(total=len(self.comparing), desc="Summarizing videos", leave=False)
+        for compare_path in self.comparing:
+            self.summaries[compare_path] = await VideoSummary.load_or_build(
+                compare_path,
+                PREFILTER["sample_interval"],
+                self.catalog.get(compare_path),
+                self.cancelled
+            )
+            pbar.update()
+        pbar.close()
+
+    def plan_videos(self, original: np.ndarray) -> list[str]:
+        """
+        Rank comparing videos by chance of containing original and prune unlikely ones.
+        Returns all videos if prefilter is disabled
+        :param original: Original image
+        :return: Videos to scan, most likely first
+        """
+        if not PREFILTER["use"]:
+            return self.comparing
+
+        protocols = [name for name, _ in self.enabled_protocols()]
+        scores = {path: self.summaries[path].score(original, protocols) for path in self.comparing}
+        ranked = sorted(self.comparing, key=lambda path: scores[path], reverse=True)
+
+        keep_top = max(1, int(np.ceil(len(ranked) * PREFILTER["keep_ratio"])))
+        planned = [path for i, path in enumerate(ranked) if i < keep_top or scores[path] >= PREFILTER["min_score"]]
+
+        pruned = len(self.comparing) - len(planned)
+        self.pruned_videos += pruned
+        self.logger.debug(f"Prefilter pruned {pruned} of {len(self.comparing)} videos")
+        return planned
+
+    async def iterate_candidate_frames(self, frame_compiler: FrameCompiler, original: np.ndarray,
+                                       thresholds: dict[str, float]):
+        """
+        Iterate frames, which can contain original.
+        If shot search is enabled, original is first matched against representative frames of every shot,
+        and only shots with representatives close to the threshold are scanned frame by frame
+        Yields a tuple of [frameNumber, frameArray]
+        :param frame_compiler: Opened frame compiler
+        :param original: Original image
+        :param thresholds: Protocol -> threshold of the original
+        :return: Generator
+        """
+        if not SHOT_SEARCH["use"]:
+            async for frame_index, frame in frame_compiler.iterate_frames():
+                yield frame_index, frame
+            return
+
+        try:
+            shots = await frame_compiler.get_shots(SHOT_SEARCH["cut_threshold"])
+            await frame_compiler.load_seek_index()  # Shots are read by seeking
+        except SearchCancelled:
+            return
+
+        # Representatives of all shots are read in one ordered pass, so every GOP is decoded at most once
+        shot_of_frame = {
+            frame_number - 1: shot_index
+            for shot_index, shot in enumerate(shots)
+            for frame_number in frame_compiler.shot_representatives(shot, SHOT_SEARCH["representatives"])
+        }
+
+        candidates = set()
+        async for frame_index, frame in frame_compiler.fetch_frames(shot_of_frame):
+            if self.cancelled.is_set():
+                return
+
+            shot_index = shot_of_frame[frame_index]
+            if shot_index in candidates:
+                continue
+
+            match_processor = self.match_processor(original, frame)
+            if any(match_processor.similarity_score(protocol) >= threshold - SHOT_SEARCH["margin"]
+                   for protocol, threshold in thresholds.items()):
+                candidates.add(shot_index)
+
+        # Adjacent candidate shots are read as one range
+        ranges = []
+        for shot_index in sorted(candidates):
+            start, end = shots[shot_index]
+            if ranges and ranges[-1][1] + 1 == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+
+        self.logger.debug(f"Scanning {len(candidates)} of {len(shots)} shots")
+        for start, end in ranges:
+            if self.cancelled.is_set():
+                return
+
+            async for frame_index, frame in frame_compiler.read_range(start, end):
+                yield frame_index, frame
+
+    async def iterate_candidate_batches(self, frame_compiler: FrameCompiler, original: np.ndarray,
+                                        thresholds: dict[str, float]):
+        """
+        Group candidate frames into batches, which fit frame queue budget
+        Yields a list of [frameNumber, frameArray]
+        :param frame_compiler: Opened frame compiler
+        :param original: Original image
+        :param thresholds: Protocol -> threshold of the original
+        :return: Generator
+        """
+        batch = []
+        batch_size = 1  # First frame tells frame size
+        async for frame_index, frame in self.iterate_candidate_frames(frame_compiler, original, thresholds):
+            batch.append((frame_index, frame))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                batch_size = ResourceBudget.frame_slots(frame.nbytes, FrameCompiler.READ_BATCH)
+
+        if batch:
+            yield batch
 
     async def search(self) -> AsyncGenerator[tuple[str, str, str, timedelta] | None]:
         """
         Search for original/comparing matches and yield every result.
+        Only the representative of every near-duplicate cluster is searched,
+        its hits are verified against other cluster members.
 
         Yields:
             tuple: (original_path, compare_path, protocol_name, timecode)
         """
+        clusters = self.get_clusters()
+
+        try:
+            if LIBRARY_DEDUP["use"]:
+                await self.deduplicate_library()
+
+            if PREFILTER["use"]:
+                await self.build_summaries()
+
+            if CALIBRATION["use"]:
+                await self.calibrate()
+        except SearchCancelled:
+            self.logger.info("Search cancelled")
+            return
+
         global_pbar = tqdm(
             total=len(self.originals),
             desc="Processing originals"
         )
 
-        for original_path in self.originals:
+        for cluster in clusters:
+            if self.cancelled.is_set():
+                self.logger.info("Search cancelled")
+                break
+
+            original_path = cluster[0]
             self.logger.debug(
                 f"Searching original [bold cyan]{original_path.split('/')[-1]}[/bold cyan] for comparisons"
+                + (f" (+{len(cluster) - 1} near-duplicates)" if len(cluster) > 1 else "")
             )
 
-            original = Image.open(original_path)
-            original = np.array(original)
+            original = self.prepare_original(original_path)
+
+            members = {path: self.prepare_original(path) for path in cluster[1:]}
+            originals = {original_path: original, **members}
+            self.prepared.clear()
+
+            # Representative searches with the lowest threshold of the cluster, relaxed, so near-duplicates are not missed
+            relax = CLUSTER_ORIGINALS["threshold_relax"] if members else 0
+            representative_thresholds = {
+                protocol: min(self.similarity(path, protocol) for path in originals) - relax
+                for protocol, _ in self.enabled_protocols()
+            }
+            self.search_thresholds = {
+                id(image): {protocol: self.similarity(path, protocol) for protocol, _ in self.enabled_protocols()}
+                for path, image in members.items()
+            }
+            self.search_thresholds[id(original)] = representative_thresholds
+
+            comparing = self.plan_videos(original)
+
+            queries = {path: self.create_query() for path in originals}
 
             compare_pbar = tqdm(
-                total=len(self.comparing),
+                total=len(comparing),
                 desc=f"Searching all comparisons for {original_path.split('/')[-1]}",
                 leave=False
             )
 
-            for compare_path in self.comparing:
+            for compare_path in comparing:
+                if self.cancelled.is_set():
+                    break
+
+                if all(query.satisfied for query in queries.values()):
+                    self.logger.debug("All originals are satisfied, skipping remaining comparisons")
+                    break
+
                 self.logger.debug(f"Comparing {compare_path}")
+                for protocols in self.prepared.values():
+                    for protocol in protocols.values():
+                        protocol.reset()
 
-                async with FrameCompiler(compare_path) as frame_compiler:
+                async with FrameCompiler(compare_path, self.catalog.get(compare_path), self.cancelled) as frame_compiler:
                     total_frames = frame_compiler.total_frames
 
                     self.logger.debug(
@@ -64,32 +428,56 @@ class SearchProcessor:
                         leave=False
                     )
 
-                    async for frame_index, frame in frame_compiler.iterate_frames():
-                        match_processor = FrameMatchProcessor(original, frame)
+                    async for batch in self.iterate_candidate_batches(frame_compiler, original, representative_thresholds):
+                        if self.cancelled.is_set() or all(query.is_capped(compare_path) for query in queries.values()):
+                            break
+
+                        representative_scores = self.score_batch(original, batch)
+
+                        for frame_index, frame in batch:
+                            if self.cancelled.is_set() or all(query.is_capped(compare_path) for query in queries.values()):
+                                break
 
-                        ssim = PROTOCOLS["ssim"]
-                        phash = PROTOCOLS["phash"]
-                        template = PROTOCOLS["template"]
+                            seconds = frame_index / frame_compiler.fps
+                            timecode = timedelta(seconds=seconds)
 
-                        seconds = frame_index / frame_compiler.fps
-                        timecode = timedelta(seconds=seconds)
+                            for protocol, _ in self.enabled_protocols():
+                                representative_score = representative_scores[protocol].get(frame_index)
+                                if representative_score is None or representative_score < representative_thresholds[protocol]:
+                                    continue
 
-                        if ssim["use"] and match_processor.compare_ssim(ssim["similarity"]):
-                            yield original_path, compare_path, "SSIM", timecode
+                                for path, image in originals.items():
+                                    query = queries[path]
+                                    if query.is_capped(compare_path):
+                                        continue
 
-                        if phash["use"] and match_processor.compare_phash(phash["similarity"]):
-                            yield original_path, compare_path, "PHASH", timecode
+                                    score = representative_score if path == original_path else self.score(image, frame, protocol)
+                                    if score < self.similarity(path, protocol):
+                                        continue
 
-                        if template["use"] and match_processor.compare_template(template["similarity"]):
-                            yield original_path, compare_path, "TEMPLATE", timecode
+                                    for hit in query.offer((path, compare_path, protocol.upper(), timecode), score):
+                                        for alias_hit in self.expand_aliases(hit):
+                                            yield alias_hit
 
-                        frames_pbar.update()
+                            frames_pbar.update()
 
                     frames_pbar.close()
                 compare_pbar.update()
                 await asyncio.sleep(1)
 
             compare_pbar.close()
-            global_pbar.update()
 
-        global_pbar.close()
\ No newline at end of file
+            for query in queries.values():
+                for hit in query.finish():
+                    for alias_hit in self.expand_aliases(hit):
+                        yield alias_hit
+
+            global_pbar.update(len(cluster))
+            ResourceBudget.report(os.path.join(BASE_PATH, 'temp'), "debug")
+
+        global_pbar.close()
+        ResourceBudget.report(os.path.join(BASE_PATH, 'temp'))
+
+        if PREFILTER["use"]:
+            total_pairs = len(clusters) * len(self.comparing)
+            self.logger.info(f"Prefilter pruned {self.pruned_videos} of {total_pairs} original/video pairs")
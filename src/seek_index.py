@@ -0,0 +1,115 @@
+from logging import Logger
+
+import threading
+
+import cv2
+import numpy as np
+
+from settings import LOGGING
+from src.cancellation import check_cancelled
+from src.logger import init_logger
+from src.video_cache import VideoCache
+
+
+class SeekIndex:
+    """
+    Keyframe positions and timestamps of every frame of a video.
+    Built once by reading raw packets (without decoding) and cached.
+    Seeking to a keyframe and grabbing forward is frame-accurate even on long GOP encodes
+    """
+
+    logger: Logger = init_logger(LOGGING['frame_compiler'], "[cyan]\\[SEEK-INDEX][/cyan]")
+
+    def __init__(self, keyframes: np.ndarray, timestamps: np.ndarray):
+        """
+        :param keyframes: Sorted positions (0-based) of keyframes. Empty if keyframes are unknown
+        :param timestamps: Timestamp in milliseconds of every frame
+        """
+        self.keyframes = keyframes
+        self.timestamps = timestamps
+
+    @classmethod
+    def build(cls, video_path: str, cancelled: threading.Event | None = None) -> "SeekIndex":
+        """
+        Scan video packets and collect keyframe positions
+        :param video_path: Video path
+        :param cancelled: Raise SearchCancelled when set
+        :return: SeekIndex
+        """
+        has_key_frame = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+
+        try:
+            # Raw mode: grab() only demuxes packets, frames are not decoded
+            vidcap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        except cv2.error:
+            vidcap = cv2.VideoCapture(video_path)
+            has_key_frame = None
+
+        keyframes, timestamps = [], []
+        position = 0
+        try:
+            fps = vidcap.get(cv2.CAP_PROP_FPS)
+            while vidcap.grab():
+                check_cancelled(cancelled)
+                timestamps.append(vidcap.get(cv2.CAP_PROP_POS_MSEC))
+                if has_key_frame is not None and vidcap.get(has_key_frame):
+                    keyframes.append(position)
+                position += 1
+        finally:
+            vidcap.release()
+
+        if not keyframes:
+            cls.logger.debug(f"Keyframes are not reported for {video_path}, falling back to direct seeking")
+
+        # Packets are in decode order, sort timestamps to display order
+        timestamps = np.sort(np.array(timestamps, dtype=np.float64))
+
+        # Raw mode may not report packet timestamps, then all of them read as 0
+        if len(timestamps) > 1 and not (timestamps[-1] > 0 and np.all(np.diff(timestamps) > 0)):
+            cls.logger.debug(f"Timestamps are not reported for {video_path}, using constant frame rate")
+            timestamps = np.arange(len(timestamps), dtype=np.float64) * 1000 / (fps or 25)
+
+        return cls(np.array(keyframes, dtype=np.int64), timestamps)
+
+    @classmethod
+    def load_or_build(cls, video_path: str, cancelled: threading.Event | None = None) -> "SeekIndex":
+        """
+        Load seek index from cache or build it
+        :param video_path: Video path
+        :param cancelled: Raise SearchCancelled when set while building
+        :return: SeekIndex
+        """
+        cached = VideoCache.load_arrays(video_path, "seek_index_v2")
+        if cached is not None:
+            return cls(cached["keyframes"], cached["timestamps"])
+
+        seek_index = cls.build(video_path, cancelled)
+        VideoCache.save_arrays(video_path, "seek_index_v2",
+                               keyframes=seek_index.keyframes,
+                               timestamps=seek_index.timestamps)
+        cls.logger.debug(f"Built seek index of {len(seek_index.timestamps)} frames for {video_path}")
+        return seek_index
+
+    def keyframe_before(self, position: int) -> int:
+        """
+        Get the closest keyframe at or before frame position
+        :param position: Frame position (0-based)
+        :return: Keyframe position. Frame position itself if keyframes are unknown
+        """
+        if not len(self.keyframes):
+            return position
+
+        i = int(np.searchsorted(self.keyframes, position, side="right")) - 1
+        return int(self.keyframes[max(i, 0)])
+
+    def position_at_ms(self, ms: float) -> int:
+        """
+        Get frame position displayed at timestamp
+        :param ms: Timestamp in milliseconds
+        :return: Frame position (0-based)
+        """
+        if not len(self.timestamps):
+            return 0
+
+        i = int(np.searchsorted(self.timestamps, ms, side="right")) - 1
+        return min(max(i, 0), len(self.timestamps) - 1)
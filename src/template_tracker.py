@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+
+class TemplateTracker:
+    """
+    Tracking state of one original in one video for template matching.
+    After a hit, following frames are searched only in a padded window around the last match location.
+    Falls back to full-frame search when window score drops below threshold or on scene cut.
+    Hit/miss is the same as with full-frame search, but score of a window hit is the window maximum,
+    which can be lower than the full-frame maximum (if the original is also elsewhere in the frame)
+    """
+
+    CUT_THRESHOLD = 30  # Mean absolute difference of downscaled gray frames [0..255], considered a scene cut
+    THUMBNAIL_SIZE = (32, 18)
+
+    def __init__(self, threshold: float, padding: int = 32, confirm_score: float | None = None):
+        """
+        :param threshold: Score, which is considered a hit
+        :param padding: Pixels around last match location to search in
+        :param confirm_score: Window hits with this score are searched in full frame again, so the reported score is exact
+        """
+        self.threshold = threshold
+        self.padding = padding
+        self.confirm_score = confirm_score
+
+        self.last_loc: tuple[int, int] | None = None
+        self.last_thumbnail: np.ndarray | None = None
+
+        self.window_searches = 0
+        self.full_searches = 0
+
+    def is_cut(self, frame_gray: np.ndarray) -> bool:
+        thumbnail = cv2.resize(frame_gray, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        previous, self.last_thumbnail = self.last_thumbnail, thumbnail
+
+        if previous is None:
+            return True
+
+        return float(cv2.absdiff(previous, thumbnail).mean()) > self.CUT_THRESHOLD
+
+    def match(self, frame_gray: np.ndarray, template_gray: np.ndarray) -> float:
+        """
+        Match template in frame, using tracking window if possible
+        :param frame_gray: Gray frame
+        :param template_gray: Gray template
+        :return: Best match score
+        """
+        is_cut = self.is_cut(frame_gray)
+
+        if self.last_loc is not None and not is_cut:
+            th, tw = template_gray.shape[:2]
+            fh, fw = frame_gray.shape[:2]
+            x, y = self.last_loc
+
+            x0, y0 = max(0, x - self.padding), max(0, y - self.padding)
+            x1, y1 = min(fw, x + tw + self.padding), min(fh, y + th + self.padding)
+
+            if x1 - x0 >= tw and y1 - y0 >= th:
+                res = cv2.matchTemplate(frame_gray[y0:y1, x0:x1], template_gray, cv2.TM_CCOEFF_NORMED)
+                _, max_val, _, max_loc = cv2.minMaxLoc(res)
+                self.window_searches += 1
+
+                is_confirmed = self.confirm_score is not None and max_val >= self.confirm_score
+                if max_val >= self.threshold and not is_confirmed:
+                    self.last_loc = (x0 + max_loc[0], y0 + max_loc[1])
+                    return max_val
+
+        res = cv2.matchTemplate(frame_gray, template_gray, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        self.full_searches += 1
+
+        self.last_loc = max_loc if max_val >= self.threshold else None
+        return max_val
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import threading
+from logging import Logger
+
+import numpy as np
+from tqdm import tqdm
+
+from settings import LOGGING, PROTOCOLS
+from src.cancellation import check_cancelled
+from src.frame_compiler import FrameCompiler
+from src.logger import init_logger
+from src.protocols import get_protocol
+from src.video_cache import VideoCache
+from src.video_catalog import VideoCatalog
+
+
+class ThresholdCalibrator:
+    """
+    Derives per-original thresholds from background score distribution.
+    Every original is scored against the same random sample of library frames. Almost none of them contain the original,
+    so the scores show how high a non-matching frame can score for this particular original.
+    Flat or generic originals score high on everything and get a higher threshold, distinctive ones keep the global one
+    """
+
+    logger: Logger = init_logger(LOGGING['search_processor'], "[bold yellow]\\[CALIBRATOR][/bold yellow]")
+
+    def __init__(self,
+                 catalog: VideoCatalog,
+                 comparing: list[str],
+                 sample_frames: int = 300,
+                 z_score: float = 5.0,
+                 false_positive_rate: float | None = None,
+                 raise_only: bool = True,
+                 cancelled: threading.Event | None = None):
+        """
+        :param catalog: Video catalog
+        :param comparing: Library videos to sample frames from
+        :param sample_frames: Random frames across the library to score every original against
+        :param z_score: Threshold = median + z_score * robust std of background scores
+        :param false_positive_rate: If set, threshold is the (1 - rate) quantile of background scores instead
+        :param raise_only: Never go below protocol similarity
+        :param cancelled: Raise SearchCancelled when set, nothing is cached then
+        """
+        self.catalog = catalog
+        self.comparing = sorted(comparing)
+        self.sample_frames = sample_frames
+        self.z_score = z_score
+        self.false_positive_rate = false_positive_rate
+        self.raise_only = raise_only
+        self.cancelled = cancelled
+
+        self.library_key = hashlib.sha1("\n".join(self.comparing).encode()).hexdigest()
+
+    def sample_key(self, protocol: str) -> str:
+        """
+        Background scores are reused only if library, sample size and protocol options are the same
+        """
+        data = json.dumps([self.library_key, self.sample_frames, PROTOCOLS[protocol]], sort_keys=True, default=str)
+        return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+    def sample_positions(self) -> dict[str, list[int]]:
+        """
+        Pick random frames across the library, proportionally to video length
+        :return: Video path -> frame indexes (0-based)
+        """
+        frame_counts = np.array([(self.catalog.get(path) or {}).get("frame_count", 0) for path in self.comparing])
+        total = int(frame_counts.sum())
+        if not total:
+            return {}
+
+        rng = np.random.default_rng(0)
+        picks = np.sort(rng.choice(total, size=min(self.sample_frames, total), replace=False))
+        video_indexes = np.searchsorted(np.cumsum(frame_counts), picks, side="right")
+        starts = np.concatenate([[0], np.cumsum(frame_counts)[:-1]])
+
+        positions: dict[str, list[int]] = {}
+        for pick, video_index in zip(picks, video_indexes):
+            positions.setdefault(self.comparing[video_index], []).append(int(pick - starts[video_index]))
+        return positions
+
+    async def background_scores(self, originals: dict[str, np.ndarray],
+                                protocols: list[str]) -> dict[str, dict[str, list[float]]]:
+        """
+        Load background scores from cache, scoring the sample for originals without them
+        :param originals: Original path -> BGR image
+        :param protocols: Protocol names
+        :return: Original path -> protocol -> scores
+        """
+        keys = {protocol: self.sample_key(protocol) for protocol in protocols}
+        cached: dict[str, dict] = {path: VideoCache.load_json(path, "calibration") or {} for path in originals}
+
+        scores = {path: {} for path in originals}
+        missing = []
+        for path in originals:
+            for protocol in protocols:
+                entry = cached[path].get(protocol)
+                if entry and entry["key"] == keys[protocol]:
+                    scores[path][protocol] = entry["scores"]
+                else:
+                    missing.append((path, protocol))
+
+        if not missing:
+            return scores
+
+        # Tracking state makes no sense between unrelated frames
+        backends = {
+            (path, protocol): get_protocol(protocol)(originals[path], {**PROTOCOLS[protocol], "tracking": False})
+            for path, protocol in missing
+        }
+        for path, protocol in missing:
+            scores[path][protocol] = []
+
+        positions = self.sample_positions()
+        pbar = tqdm(total=sum(len(p) for p in positions.values()), desc="Calibrating thresholds", leave=False)
+        for video_path, frame_indexes in positions.items():
+            async with FrameCompiler(video_path, self.catalog.get(video_path), self.cancelled) as frame_compiler:
+                async for _, frame in frame_compiler.fetch_frames(frame_indexes):
+                    check_cancelled(self.cancelled)
+                    for (path, protocol), backend in backends.items():
+                        scores[path][protocol].append(float(backend.score(frame)))
+                    pbar.update()
+        pbar.close()
+
+        for path in {path for path, _ in missing}:
+            cached[path].update({
+                protocol: {"key": keys[protocol], "scores": scores[path][protocol]}
+                for protocol in protocols
+            })
+            VideoCache.save_json(path, "calibration", cached[path])
+
+        return scores
+
+    def threshold(self, scores: list[float], similarity: float) -> float:
+        """
+        Derive threshold from background scores
+        :param scores: Background scores of original
+        :param similarity: Global protocol similarity
+        :return: Threshold
+        """
+        if not scores:
+            return similarity
+
+        scores = np.asarray(scores)
+        if self.false_positive_rate is not None:
+            threshold = float(np.quantile(scores, 1 - self.false_positive_rate))
+        else:
+            # Median and MAD are not thrown off by the few sampled frames which really contain the original
+            median = float(np.median(scores))
+            robust_std = 1.4826 * float(np.median(np.abs(scores - median)))
+            threshold = median + self.z_score * robust_std
+
+        if self.raise_only:
+            threshold = max(threshold, similarity)
+
+        return min(threshold, 1.0)
+
+    async def calibrate(self, originals: dict[str, np.ndarray],
+                        protocols: list[tuple[str, float]]) -> dict[str, dict[str, float]]:
+        """
+        Calibrate thresholds of originals
+        :param originals: Original path -> BGR image
+        :param protocols: List of [protocol name, similarity]
+        :return: Original path -> protocol -> threshold
+        """
+        scores = await self.background_scores(originals, [name for name, _ in protocols])
+
+        thresholds = {
+            path: {name: self.threshold(scores[path][name], similarity) for name, similarity in protocols}
+            for path in originals
+        }
+
+        for name, similarity in protocols:
+            values = [thresholds[path][name] for path in originals]
+            if values:
+                self.logger.info(
+                    f"{name.upper()} thresholds: {min(values):.3f} - {max(values):.3f} "
+                    f"(global {similarity}), {sum(v > similarity for v in values)} of {len(values)} originals raised"
+                )
+
+        return thresholds
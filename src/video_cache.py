@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from settings import BASE_PATH, CACHE_FOLDER_NAME
+
+
+class VideoCache:
+    """
+    Stores data derived from videos (summaries, shot boundaries, etc.) in the cache folder.
+    Cache key includes video size and modification time, so changed videos are never picked up from old cache
+    """
+
+    @staticmethod
+    def path(video_path: str, kind: str, extension: str) -> str:
+        """
+        Get cache file path for video
+        :param video_path: Video path
+        :param kind: Cache kind (subfolder), e.g. "summary"
+        :param extension: File extension, e.g. ".json"
+        :return: Cache file path
+        """
+        stat = os.stat(video_path)
+        path_hash = hashlib.sha1(os.path.abspath(video_path).encode()).hexdigest()[:16]
+        key = f"{path_hash}_{stat.st_size}_{int(stat.st_mtime)}"
+        return os.path.join(BASE_PATH, CACHE_FOLDER_NAME, kind, key + extension)
+
+    @staticmethod
+    def part_path(path: str) -> str:
+        """
+        Temporary file to write before replacing cache file. Unique per thread, so concurrent searches don't mix writes
+        """
+        return f"{path}.{os.getpid()}-{threading.get_ident()}.part"
+
+    @classmethod
+    def load_json(cls, video_path: str, kind: str) -> dict | list | None:
+        path = cls.path(video_path, kind, ".json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def save_json(cls, video_path: str, kind: str, data: dict | list) -> None:
+        path = cls.path(video_path, kind, ".json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        part_path = cls.part_path(path)
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(part_path, path)
+
+    @classmethod
+    def load_arrays(cls, video_path: str, kind: str) -> dict[str, np.ndarray] | None:
+        path = cls.path(video_path, kind, ".npz")
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as data:
+            return {k: data[k] for k in data.files}
+
+    @classmethod
+    def save_arrays(cls, video_path: str, kind: str, **arrays: np.ndarray) -> None:
+        path = cls.path(video_path, kind, ".npz")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        part_path = cls.part_path(path)
+        with open(part_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(part_path, path)
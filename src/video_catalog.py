@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+
+import cv2
+
+from settings import LOGGING, BASE_PATH, CACHE_FOLDER_NAME, SCAN_WORKERS
+from src.folder_reader import FolderReader
+from src.logger import init_logger
+from src.video_cache import VideoCache
+
+
+class VideoCatalog:
+    """
+    Persistent catalog of video metadata (size, mtime, codec, resolution, fps, frame count, duration).
+    Videos are probed only when new or changed, so tools don't have to reopen every video
+    """
+
+    logger: Logger = init_logger(LOGGING['frame_compiler'], "[cyan]\\[CATALOG][/cyan]")
+
+    def __init__(self, catalog_path: str | None = None):
+        self.catalog_path = catalog_path or os.path.join(BASE_PATH, CACHE_FOLDER_NAME, "catalog.json")
+        self.entries: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.is_dirty = False
+
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.catalog_path):
+            return
+
+        with open(self.catalog_path, "r", encoding="utf-8") as f:
+            self.entries = json.load(f)
+
+    def save(self) -> None:
+        if not self.is_dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.catalog_path), exist_ok=True)
+        with self.lock:
+            part_path = VideoCache.part_path(self.catalog_path)
+            with open(part_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(part_path, self.catalog_path)
+            self.is_dirty = False
+
+    @staticmethod
+    def probe(path: str, size: int, mtime: float) -> dict:
+        """
+        Read video metadata
+        :param path: Video path
+        :param size: File size
+        :param mtime: File modification time
+        :return: Catalog entry
+        """
+        entry = {
+            "path": path,
+            "size": size,
+            "mtime": mtime,
+            "readable": False,
+        }
+
+        vidcap = cv2.VideoCapture(path)
+        try:
+            if not vidcap.isOpened():
+                return entry
+
+            fourcc = int(vidcap.get(cv2.CAP_PROP_FOURCC))
+            fps = vidcap.get(cv2.CAP_PROP_FPS)
+            frame_count = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+            entry.update({
+                "codec": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\x00"),
+                "width": int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": fps,
+                "frame_count": frame_count,
+                "duration": frame_count / fps if fps else 0,
+                # Images are opened as single frame videos, they are not comparing files
+                "readable": fps > 0 and frame_count > 1 and vidcap.grab(),
+            })
+        finally:
+            vidcap.release()
+
+        return entry
+
+    def is_fresh(self, path: str, size: int, mtime: float) -> bool:
+        entry = self.entries.get(path)
+        return entry is not None and entry["size"] == size and entry["mtime"] == mtime
+
+    def refresh(self, folder: str) -> list[str]:
+        """
+        Scan folder and probe new or changed files in parallel. Removed files are dropped from catalog
+        :param folder: Folder to scan
+        :return: Readable video paths in folder
+        """
+        files = FolderReader.scan_files(folder, SCAN_WORKERS)
+        stale = [f for f in files if not self.is_fresh(*f)]
+
+        if stale:
+            self.logger.info(f"Probing {len(stale)} new or changed files")
+            with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+                for entry in executor.map(lambda f: self.probe(*f), stale):
+                    with self.lock:
+                        self.entries[entry["path"]] = entry
+                        self.is_dirty = True
+
+        found = {f[0] for f in files}
+        prefix = os.path.abspath(folder) + os.sep
+        with self.lock:
+            for path in [p for p in self.entries if p.startswith(prefix) and p not in found]:
+                del self.entries[path]
+                self.is_dirty = True
+
+        self.save()
+
+        videos = [f[0] for f in files if self.entries[f[0]]["readable"]]
+        if len(videos) < len(files):
+            self.logger.info(f"Skipped {len(files) - len(videos)} unreadable or non-video files")
+
+        return videos
+
+    def get(self, path: str) -> dict | None:
+        """
+        Get video metadata. Video is probed if not in catalog or changed
+        :param path: Video path
+        :return: Catalog entry or None if file does not exist
+        """
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        if not self.is_fresh(path, stat.st_size, stat.st_mtime):
+            entry = self.probe(path, stat.st_size, stat.st_mtime)
+            with self.lock:
+                self.entries[path] = entry
+                self.is_dirty = True
+
+        return self.entries[path]
@@ -0,0 +1,147 @@
+from logging import Logger
+
+import threading
+
+import cv2
+import numpy as np
+
+from settings import LOGGING
+from src.batch_hash import BatchHasher
+from src.cancellation import check_cancelled
+from src.frame_compiler import FrameCompiler
+from src.logger import init_logger
+from src.video_cache import VideoCache
+
+
+class VideoSummary:
+    """
+    Compact per-video summary: PHashes and colour histograms of frames sampled at fixed interval.
+    Used to rank and prune videos, which can not contain an original, before the frame-level scan
+    """
+
+    logger: Logger = init_logger(LOGGING['search_processor'], "[bold yellow]\\[PREFILTER][/bold yellow]")
+
+    HIST_BINS = [16, 8]  # Hue, saturation
+    FULL_FRAME_PROTOCOLS = ("ssim", "phash")  # Other protocols can match a part of the frame
+    HASH_BATCH_SIZE = 64
+
+    def __init__(self, video_path: str, hashes: np.ndarray, histograms: np.ndarray, frame_pixels: int):
+        """
+        :param video_path: Video path
+        :param hashes: Packed PHashes of sampled frames, shape (n, 8)
+        :param histograms: Normalized HS histograms of sampled frames, shape (n, bins)
+        :param frame_pixels: Pixel count of video frame
+        """
+        self.video_path = video_path
+        self.hashes = hashes
+        self.histograms = histograms
+        self.frame_pixels = frame_pixels
+
+    @staticmethod
+    def hash_images(images: list[np.ndarray]) -> np.ndarray:
+        """
+        Packed PHashes of BGR images
+        :return: Array of shape (n, 8) uint8
+        """
+        return BatchHasher.phash(images).astype(">u8").view(np.uint8).reshape(-1, 8)
+
+    @classmethod
+    def histogram(cls, image: np.ndarray) -> np.ndarray:
+        """
+        Normalized hue/saturation histogram of BGR image
+        """
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, cls.HIST_BINS, [0, 180, 0, 256]).flatten()
+        return (hist / max(hist.sum(), 1)).astype(np.float32)
+
+    @classmethod
+    async def load_or_build(cls, video_path: str, sample_interval: float = 1.0, metadata: dict | None = None,
+                            cancelled: threading.Event | None = None) -> "VideoSummary":
+        """
+        Load summary from cache or build it by sampling video frames
+        :param video_path: Video path
+        :param sample_interval: Interval between sampled frames in seconds
+        :param metadata: Video catalog entry
+        :param cancelled: Raise SearchCancelled when set while building
+        :return: VideoSummary
+        """
+        kind = f"summary_{sample_interval:g}"
+        cached = VideoCache.load_arrays(video_path, kind)
+        if cached is not None:
+            return cls(video_path, cached["hashes"], cached["histograms"], int(cached["frame_pixels"]))
+
+        hashes, histograms = [], []
+        frame_pixels = 0
+        batch = []
+
+        async with FrameCompiler(video_path, metadata, cancelled) as frame_compiler:
+            step = int(round((frame_compiler.fps or 1) * sample_interval))
+            async for _, frame in frame_compiler.sample_frames(step):
+                check_cancelled(cancelled)
+                frame = cv2.resize(frame, (frame.shape[1] // 4 or 1, frame.shape[0] // 4 or 1), interpolation=cv2.INTER_AREA)
+                frame_pixels = frame.shape[0] * frame.shape[1] * 16
+                histograms.append(cls.histogram(frame))
+
+                batch.append(frame)
+                if len(batch) >= cls.HASH_BATCH_SIZE:
+                    hashes.append(cls.hash_images(batch))
+                    batch = []
+
+        if batch:
+            hashes.append(cls.hash_images(batch))
+
+        summary = cls(
+            video_path,
+            np.concatenate(hashes) if hashes else np.empty((0, 8), dtype=np.uint8),
+            np.array(histograms, dtype=np.float32).reshape(-1, int(np.prod(cls.HIST_BINS))),
+            frame_pixels
+        )
+        VideoCache.save_arrays(video_path, kind,
+                               hashes=summary.hashes,
+                               histograms=summary.histograms,
+                               frame_pixels=np.array(frame_pixels))
+        cls.logger.debug(f"Built summary of {len(summary.hashes)} samples for {video_path}")
+        return summary
+
+    def hash_score(self, original_hash: np.ndarray) -> float:
+        """
+        Full-frame similarity of original to the closest sampled frame
+        :param original_hash: Packed PHash of original
+        :return: Score [0..1]
+        """
+        if not len(self.hashes):
+            return 0.0
+
+        distances = np.unpackbits(self.hashes ^ original_hash, axis=1).sum(axis=1)
+        return 1 - distances.min() / 64
+
+    def containment_score(self, original_histogram: np.ndarray, original_pixels: int) -> float:
+        """
+        How much of original colours are present in the closest sampled frame.
+        Works for crops, as original is expected to be only a part of the frame
+        :param original_histogram: Normalized histogram of original
+        :param original_pixels: Pixel count of original
+        :return: Score [0..1]
+        """
+        if not len(self.histograms):
+            return 0.0
+
+        area_ratio = min(1.0, original_pixels / max(self.frame_pixels, 1))
+        expected = original_histogram * area_ratio
+        covered = np.minimum(1.0, self.histograms / np.maximum(expected, 1e-9))
+        return float((covered * original_histogram).sum(axis=1).max())
+
+    def score(self, original: np.ndarray, protocols: list[str]) -> float:
+        """
+        Score chance of original being in this video
+        :param original: Original image (BGR)
+        :param protocols: Enabled protocol names
+        :return: Score [0..1], the higher the more likely
+        """
+        scores = []
+        if any(p in self.FULL_FRAME_PROTOCOLS for p in protocols):
+            scores.append(self.hash_score(self.hash_images([original])[0]))
+        if any(p not in self.FULL_FRAME_PROTOCOLS for p in protocols):
+            scores.append(self.containment_score(self.histogram(original), original.shape[0] * original.shape[1]))
+
+        return max(scores, default=1.0)